@@ -2,15 +2,36 @@
 Export Financial Statements for Q1-Q3 2025
 """
 import os
-import json
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime
 from new_int import (
     get_profit_and_loss,
     get_balance_sheet,
     get_cash_flow,
-    save_to_csv
+    save_to_csv,
+    serialize_json
 )
 
+# Xero allows 5 concurrent calls per tenant; any more are rejected with 429s
+MAX_WORKERS = 5
+
+def _writer_loop(write_q):
+    """Write serialized statements to disk until a None sentinel arrives"""
+    while True:
+        item = write_q.get()
+        if item is None:
+            break
+        label, filename, payload = item
+        with open(filename, 'wb') as f:
+            f.write(payload)
+        print(f"  ✓ {label} saved to {filename}")
+
+def _fetch_statement(write_q, label, fn, args, filename):
+    """Fetch one statement and hand it to the writer thread"""
+    write_q.put((label, filename, serialize_json(fn(*args))))
+
 def export_financial_statements():
     """Export financial statements for Q1-Q3 2025"""
     # Create exports directory if it doesn't exist
@@ -23,45 +44,51 @@ def export_financial_statements():
     q2_end = '2025-06-30'
     q3_start = '2025-07-01'
     q3_end = '2025-09-30'
+    quarters = [(q1_start, q1_end), (q2_start, q2_end), (q3_start, q3_end)]
     
     print("Exporting financial statements for 2025...")
     
+    # Each job is (label, fetch function, args, output path)
+    jobs = []
+    for q, (start, end) in enumerate(quarters, 1):
+        jobs.append((f"Profit & Loss Q{q} 2025 ({start} to {end})",
+                     get_profit_and_loss, (start, end), f"xero_exports/pnl_q{q}_2025.json"))
+    for q, (_, end) in enumerate(quarters, 1):
+        jobs.append((f"Balance Sheet end of Q{q} 2025 ({end})",
+                     get_balance_sheet, (end,), f"xero_exports/balance_sheet_q{q}_2025.json"))
+    for q, (start, end) in enumerate(quarters, 1):
+        jobs.append((f"Cash Flow Q{q} 2025 ({start} to {end})",
+                     get_cash_flow, (start, end), f"xero_exports/cash_flow_q{q}_2025.json"))
+    
+    # Workers fetch and serialize, a single writer thread does the disk I/O
+    write_q = queue.Queue()
+    writer = threading.Thread(target=_writer_loop, args=(write_q,), daemon=True)
+    writer.start()
+    
     try:
-        # 1. Export Quarterly Profit & Loss Statements
-        print("\nExporting Profit & Loss statements...")
-        for q, (start, end) in enumerate([(q1_start, q1_end), (q2_start, q2_end), (q3_start, q3_end)], 1):
-            print(f"  Q{q} 2025 ({start} to {end})")
-            pnl = get_profit_and_loss(start, end)
-            filename = f"xero_exports/pnl_q{q}_2025.json"
-            with open(filename, 'w') as f:
-                json.dump(pnl, f, indent=2)
-            print(f"    ✓ Saved to {filename}")
-        
-        # 2. Export Quarterly Balance Sheets
-        print("\nExporting Balance Sheets...")
-        for q, date in enumerate([q1_end, q2_end, q3_end], 1):
-            print(f"  End of Q{q} 2025 ({date})")
-            balance_sheet = get_balance_sheet(date)
-            filename = f"xero_exports/balance_sheet_q{q}_2025.json"
-            with open(filename, 'w') as f:
-                json.dump(balance_sheet, f, indent=2)
-            print(f"    ✓ Saved to {filename}")
+        # The statements are independent, so fetch them concurrently
+        with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+            futures = [
+                executor.submit(_fetch_statement, write_q, label, fn, args, filename)
+                for label, fn, args, filename in jobs
+            ]
+            
+            for future in as_completed(futures):
+                future.result()
         
-        # 3. Export Quarterly Cash Flow Statements
-        print("\nExporting Cash Flow statements...")
-        for q, (start, end) in enumerate([(q1_start, q1_end), (q2_start, q2_end), (q3_start, q3_end)], 1):
-            print(f"  Q{q} 2025 ({start} to {end})")
-            cash_flow = get_cash_flow(start, end)
-            filename = f"xero_exports/cash_flow_q{q}_2025.json"
-            with open(filename, 'w') as f:
-                json.dump(cash_flow, f, indent=2)
-            print(f"    ✓ Saved to {filename}")
+        # Let the writer flush everything queued before reporting success
+        write_q.put(None)
+        writer.join()
         
         print("\n✅ All financial statements exported successfully!")
         
     except Exception as e:
         print(f"\n❌ Error exporting financial statements: {str(e)}")
         raise
+    finally:
+        if writer.is_alive():
+            write_q.put(None)
+            writer.join()
 
 if __name__ == "__main__":
     export_financial_statements()
@@ -2,9 +2,8 @@
 Export Profit and Loss Statement
 """
 import os
-import json
 from datetime import datetime
-from new_int import get_profit_and_loss
+from new_int import get_profit_and_loss, save_to_json
 
 def export_pnl():
     """Export Profit and Loss statement for Q1-Q3 2025"""
@@ -27,8 +26,7 @@ def export_pnl():
             print(f"\nExporting Q{q} 2025 ({start} to {end})")
             pnl = get_profit_and_loss(start, end)
             filename = f"xero_exports/financial_statements/pnl_q{q}_2025.json"
-            with open(filename, 'w') as f:
-                json.dump(pnl, f, indent=2)
+            save_to_json(pnl, filename)
             print(f"✓ Saved to {filename}")
         
         print("\n✅ All Profit and Loss statements exported successfully!")
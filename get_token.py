@@ -42,17 +42,19 @@ scopes = [
 auth_url = "https://login.xero.com/identity/connect/authorize"
 token_url = "https://identity.xero.com/connect/token"
 
+# The authorization URL only depends on module-level settings, so build it once
+_SCOPE_STR = ' '.join(scopes)
+_AUTH_URL = f"{auth_url}?" + urlencode({
+    'response_type': 'code',
+    'client_id': CLIENT_ID,
+    'redirect_uri': REDIRECT_URI,
+    'scope': _SCOPE_STR,
+    'state': '123'  # Optional but recommended for security
+})
+
 def get_auth_url():
     """Generate the authorization URL for Xero OAuth2."""
-    auth_url = "https://login.xero.com/identity/connect/authorize"
-    params = {
-        'response_type': 'code',
-        'client_id': CLIENT_ID,
-        'redirect_uri': REDIRECT_URI,
-        'scope': ' '.join(scopes),
-        'state': '123'  # Optional but recommended for security
-    }
-    return f"{auth_url}?{urlencode(params)}"
+    return _AUTH_URL
 
 def exchange_code_for_token(auth_code):
     """Exchange authorization code for access token."""
@@ -152,7 +154,7 @@ def main():
     # Start the server
     print("Serving on http://localhost:5000")
     print("Open http://localhost:5000 in your browser to start the OAuth flow")
-    app.run(host='localhost', port=5000, debug=True)
+    app.run(host='localhost', port=5000, debug=False, use_reloader=False)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -3,6 +3,10 @@ import webbrowser
 import http.server
 import socketserver
 import json
+try:
+    import orjson
+except ImportError:
+    orjson = None
 from urllib.parse import urlparse, parse_qs
 from xero_python.api_client import ApiClient
 from xero_python.api_client.oauth2 import OAuth2Token
@@ -16,6 +20,62 @@ CLIENT_ID = os.getenv('CLIENT_ID')
 CLIENT_SECRET = os.getenv('CLIENT_SECRET')
 REDIRECT_URI = os.getenv('REDIRECT_URI')
 TOKEN_FILE = 'xero_token.json'  # Using JSON for better readability and consistency
+TOKEN_URL = 'https://identity.xero.com/connect/token'
+
+# One OAuth session for the code exchange and every later refresh
+_OAUTH_SESSION = OAuth2Session(CLIENT_ID, redirect_uri=REDIRECT_URI)
+
+def save_token(token_data):
+    """Atomically write the token file, skipping the write if nothing changed"""
+    if orjson is not None:
+        payload = orjson.dumps(token_data)
+    else:
+        payload = json.dumps(token_data).encode('utf-8')
+    
+    try:
+        with open(TOKEN_FILE, 'rb') as f:
+            if f.read() == payload:
+                return
+    except FileNotFoundError:
+        pass
+    
+    # Write to a temp file first so a crash can never leave a half-written token
+    tmp_file = f"{TOKEN_FILE}.tmp"
+    with open(tmp_file, 'wb') as f:
+        f.write(payload)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_file, TOKEN_FILE)
+
+def _token_fields(token):
+    """Pick out the token fields we persist"""
+    return {
+        'access_token': token['access_token'],
+        'refresh_token': token.get('refresh_token', ''),
+        'token_type': token.get('token_type', 'Bearer'),
+        'expires_at': token.get('expires_at', 0),
+        'expires_in': token.get('expires_in', 0),
+        'scope': token.get('scope', ''),  # Keep as string, not list
+        'id_token': token.get('id_token', '')
+    }
+
+def refresh_access_token():
+    """Refresh the saved token without re-running the browser flow"""
+    with open(TOKEN_FILE, 'rb') as f:
+        current = orjson.loads(f.read()) if orjson is not None else json.load(f)
+    
+    token = _OAUTH_SESSION.refresh_token(
+        TOKEN_URL,
+        refresh_token=current['refresh_token'],
+        client_id=CLIENT_ID,
+        client_secret=CLIENT_SECRET
+    )
+    token_data = _token_fields(token)
+    # Keep the tenant cached alongside the token so the refresh doesn't force a lookup
+    if current.get('tenant_id'):
+        token_data['tenant_id'] = current['tenant_id']
+    save_token(token_data)
+    return token_data
 
 def get_authorization_url():
     """Generate the authorization URL for Xero OAuth2"""
@@ -49,27 +109,14 @@ class OAuthCallbackHandler(http.server.SimpleHTTPRequestHandler):
     def handle_oauth_callback(self, code):
         """Exchange the authorization code for tokens"""
         try:
-            session = OAuth2Session(CLIENT_ID, redirect_uri=REDIRECT_URI)
-            token = session.fetch_token(
-                'https://identity.xero.com/connect/token',
+            token = _OAUTH_SESSION.fetch_token(
+                TOKEN_URL,
                 code=code,
                 client_secret=CLIENT_SECRET
             )
             
-            # Save the token with required fields
-            token_data = {
-                'access_token': token['access_token'],
-                'refresh_token': token.get('refresh_token', ''),
-                'token_type': token.get('token_type', 'Bearer'),
-                'expires_at': token.get('expires_at', 0),
-                'expires_in': token.get('expires_in', 0),
-                'scope': token.get('scope', ''),  # Keep as string, not list
-                'id_token': token.get('id_token', '')
-            }
-            
             # Save the token as JSON
-            with open(TOKEN_FILE, 'w') as f:
-                json.dump(token_data, f)
+            save_token(_token_fields(token))
             
             # Send success response
             self.send_response(200)
@@ -92,6 +139,15 @@ class OAuthCallbackHandler(http.server.SimpleHTTPRequestHandler):
             self.send_error(500, f"Error during authentication: {str(e)}")
 
 def main():
+    # Reuse the saved refresh token when we have one
+    if os.path.exists(TOKEN_FILE):
+        try:
+            refresh_access_token()
+            print("Token refreshed. You can now run xero_exporter.py")
+            return
+        except Exception as e:
+            print(f"Could not refresh the saved token ({e}), starting the browser flow")
+    
     # Start the local server
     with socketserver.TCPServer(("localhost", 5000), OAuthCallbackHandler) as httpd:
         print("Serving on port 5000...")
@@ -1,17 +1,47 @@
 import os
 import requests
 import pandas as pd
+import numpy as np
 import json
-from datetime import datetime
+import logging
+import math
+import re
+from datetime import date, datetime
+from email.utils import formatdate
 import warnings
-warnings.filterwarnings('ignore')
+import traceback
 import time
+import threading
+import copy
+import inspect
+from functools import lru_cache, wraps
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from dotenv import load_dotenv
 from token_manager import get_xero_oauth2_token
+from xero_date_fields import date_columns
+
+# orjson is much faster than the stdlib json pretty printer; fall back if it isn't installed
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# pyarrow's CSV writer is much faster than DataFrame.to_csv on wide frames
+try:
+    import pyarrow as pa
+    import pyarrow.csv as pacsv
+except ImportError:
+    pa = None
 
 # Load environment variables
 load_dotenv()
 
+# Per-page progress is logged at DEBUG so it costs nothing at the default level
+log = logging.getLogger('xero')
+logging.basicConfig(level=logging.INFO, format='%(message)s')
+
 # Get tenant ID from environment variables
 TENANT_ID = os.getenv('TENANT_ID')
 if not TENANT_ID:
@@ -27,28 +57,145 @@ BASE_URLS = {
     'projects': 'https://api.xero.com/projects.xro/2.0'
 }
 
+# Xero allows 5 concurrent calls per tenant; every request goes through _get
+# so the endpoint and page thread pools can never exceed that between them
+MAX_CONCURRENT_REQUESTS = 5
+_request_semaphore = threading.BoundedSemaphore(MAX_CONCURRENT_REQUESTS)
+
+# Shared session so every call reuses keep-alive connections to api.xero.com.
+# The pool holds exactly as many sockets as requests can be in flight, and
+# blocks rather than opening throwaway extra connections.
+# Retries (including 429s, honouring Retry-After) are handled by the adapter.
+SESSION = requests.Session()
+SESSION.mount('https://', HTTPAdapter(
+    pool_connections=4,
+    pool_maxsize=MAX_CONCURRENT_REQUESTS,
+    pool_block=True,
+    max_retries=Retry(
+        total=5,
+        backoff_factor=0.5,
+        status_forcelist=[429, 500, 502, 503, 504],
+        respect_retry_after_header=True,
+        raise_on_status=False
+    )
+))
+
+# Seconds to wait on Xero before giving up on a request
+REQUEST_TIMEOUT = 30
+
+class _RateLimiter:
+    """Thread-safe token bucket: bursts run at full speed, sustained load is
+    spread out to `rate` calls per `period` seconds"""
+    
+    def __init__(self, rate, period):
+        self.capacity = rate
+        self.fill_rate = rate / period
+        self.tokens = float(rate)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+    
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.fill_rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.fill_rate
+            time.sleep(wait)
+    
+    def drain(self):
+        """Empty the bucket so the next calls wait for it to refill"""
+        with self.lock:
+            self.tokens = 0.0
+            self.updated = time.monotonic()
+
+# Xero allows 60 calls a minute per tenant; stay a little under it
+RATE_LIMIT_CALLS = 55
+RATE_LIMIT_PERIOD = 60
+_rate_limiter = _RateLimiter(RATE_LIMIT_CALLS, RATE_LIMIT_PERIOD)
+
+# Warn once the daily allowance (5000 calls) runs this low
+DAY_LIMIT_WARNING = 100
+
+def _get(url, **kwargs):
+    """GET through the shared session, bounded by MAX_CONCURRENT_REQUESTS and the rate limiter"""
+    kwargs.setdefault('timeout', REQUEST_TIMEOUT)
+    _rate_limiter.acquire()
+    with _request_semaphore:
+        response = SESSION.get(url, **kwargs)
+    
+    # Xero reports what's left of its limits; back off before it starts refusing calls
+    minute_remaining = response.headers.get('X-MinLimit-Remaining')
+    if minute_remaining is not None and minute_remaining.isdigit() and int(minute_remaining) <= 1:
+        _rate_limiter.drain()
+    day_remaining = response.headers.get('X-DayLimit-Remaining')
+    if day_remaining is not None and day_remaining.isdigit() and int(day_remaining) <= DAY_LIMIT_WARNING:
+        log.warning(f"⚠️ Only {day_remaining} Xero API calls left today")
+    return response
+
+# Refresh the cached token this many seconds before it expires
+TOKEN_EXPIRY_BUFFER = 60
+
+# The token is valid for 30 minutes, so keep it in memory instead of
+# re-reading xero_token.json for every request
+_token_cache = {"token": None, "expires_at": 0}
+_token_lock = threading.Lock()
+
+def _get_cached_token():
+    """Return the current token, only going back to the token file near expiry"""
+    with _token_lock:
+        if _token_cache["token"] and time.time() < _token_cache["expires_at"] - TOKEN_EXPIRY_BUFFER:
+            return _token_cache["token"]
+
+        token_data = get_xero_oauth2_token()
+        if not token_data or 'access_token' not in token_data:
+            raise Exception("No valid token available. Please run get_token.py first to authenticate.")
+
+        expires_at = token_data.get('expires_at') or token_data.get('stored_at', 0) + token_data.get('expires_in', 0)
+        _token_cache["token"] = token_data
+        _token_cache["expires_at"] = expires_at
+        return token_data
+
+def _parse_json(response):
+    """Decode a JSON response body, using orjson on the raw bytes when available"""
+    if orjson is not None:
+        try:
+            return orjson.loads(response.content)
+        except orjson.JSONDecodeError as e:
+            # Re-raise as the requests error response.json() gives, so the
+            # RequestException handlers still catch HTML or empty bodies
+            raise requests.exceptions.JSONDecodeError(e.msg, e.doc, e.pos) from e
+    return response.json()
+
 # Common headers for all API calls
+# Headers only change when the access token does, so build them once per token
+_headers_cache = {"access_token": None, "headers": None}
+
 def get_headers():
-    # Get a fresh token for each request
-    token_data = get_xero_oauth2_token()
-    if not token_data or 'access_token' not in token_data:
-        raise Exception("No valid token available. Please run get_token.py first to authenticate.")
-    
-    return {
-        'Authorization': f'Bearer {token_data["access_token"]}',
-        'Xero-tenant-id': TENANT_ID,
-        'Accept': 'application/json',
-        'Content-Type': 'application/json'
-    }
+    token_data = _get_cached_token()
+    access_token = token_data["access_token"]
+    
+    if _headers_cache["access_token"] != access_token:
+        _headers_cache["headers"] = {
+            'Authorization': f'Bearer {access_token}',
+            'Xero-tenant-id': TENANT_ID,
+            'Accept': 'application/json',
+            'Content-Type': 'application/json'
+        }
+        _headers_cache["access_token"] = access_token
+    return _headers_cache["headers"]
 
 def make_api_call(url, description="API Call"):
     """Make API call with error handling and return DataFrame when possible"""
     try:
         print(f"Fetching: {description}")
-        response = requests.get(url, headers=get_headers())
+        response = _get(url, headers=get_headers())
         response.raise_for_status()
         
-        data = response.json()
+        data = _parse_json(response)
         print(f"Success: {description}")
         return data
     except requests.exceptions.RequestException as e:
@@ -63,10 +210,10 @@ def get_tenant_id():
             'Authorization': f'Bearer {ACCESS_TOKEN}',
             'Accept': 'application/json'
         }
-        response = requests.get(url, headers=headers)
+        response = _get(url, headers=headers)
         response.raise_for_status()
         
-        tenants = response.json()
+        tenants = _parse_json(response)
         print("Available Tenants:")
         for tenant in tenants:
             print(f"ID: {tenant.get('tenantId')}, Name: {tenant.get('tenantName')}")
@@ -92,11 +239,11 @@ def debug_token():
             'Authorization': f'Bearer {ACCESS_TOKEN}',
             'Accept': 'application/json'
         }
-        response = requests.get(url, headers=headers)
+        response = _get(url, headers=headers)
         print(f"Status Code: {response.status_code}")
         
         if response.status_code == 200:
-            tenants = response.json()
+            tenants = _parse_json(response)
             print("✅ Token is valid!")
             print("Available Tenants:")
             for tenant in tenants:
@@ -115,7 +262,7 @@ def debug_token():
         print(f"\n2. Testing API call with tenant ID: {TENANT_ID}")
         try:
             url = f"{BASE_URLS['accounting']}/Organisation"
-            response = requests.get(url, headers=get_headers())
+            response = _get(url, headers=get_headers())
             print(f"Status Code: {response.status_code}")
             
             if response.status_code == 200:
@@ -129,6 +276,61 @@ def debug_token():
     else:
         print("\n⚠️ Please set your TENANT_ID first!")
 
+def _use_arrow_strings(df):
+    """Store pure-string columns as Arrow strings when pyarrow is installed.
+    
+    Arrow keeps strings in one contiguous buffer instead of a Python object per
+    cell. Columns holding anything else (numbers, nested lists) are left alone.
+    """
+    if pa is None:
+        return df
+    # Checked column by column so both pandas 2 object columns and pandas 3
+    # str columns are picked up
+    string_cols = [
+        col for col, dtype in df.dtypes.items()
+        if not isinstance(dtype, pd.ArrowDtype)
+        and pd.api.types.infer_dtype(df[col], skipna=True) == 'string'
+    ]
+    if string_cols:
+        df = df.astype({col: pd.ArrowDtype(pa.string()) for col in string_cols})
+    return df
+
+# Large list endpoints whose records are flattened with _flatten_records
+# instead of pd.json_normalize
+_FLATTENED_ENDPOINTS = frozenset({'Invoices', 'Journals', 'Contacts', 'ManualJournals', 'Payments'})
+
+def _flatten_records(items, sep='.'):
+    """Flatten nested dicts into a dict of equal-length column lists.
+    
+    Produces the same column names and order as pd.json_normalize (lists are
+    left as-is, missing fields become None) without its per-record schema
+    inference.
+    """
+    columns = {}
+    
+    def _add(prefix, record, row_index):
+        for key, value in record.items():
+            name = f"{prefix}{sep}{key}" if prefix else key
+            if isinstance(value, dict):
+                _add(name, value, row_index)
+                continue
+            column = columns.get(name)
+            if column is None:
+                column = columns[name] = []
+            if len(column) < row_index:
+                column.extend([None] * (row_index - len(column)))
+            column.append(value)
+    
+    for row_index, record in enumerate(items):
+        _add('', record, row_index)
+    
+    # Pad columns that are missing from the trailing records
+    total = len(items)
+    for column in columns.values():
+        if len(column) < total:
+            column.extend([None] * (total - len(column)))
+    return columns
+
 def normalize_data(data, key_name, parent_id_name=None, parent_df=None):
     """
     Convert API response to a dictionary of DataFrames, expanding nested lists.
@@ -169,8 +371,19 @@ def normalize_data(data, key_name, parent_id_name=None, parent_df=None):
             'Rows': ('ReportID', 'Rows')
         }
 
+        # Fast path: flat records need no flattening, expansion or JSON fallback
+        if all(isinstance(row, dict) for row in items) and not any(
+            isinstance(value, (dict, list)) for row in items for value in row.values()
+        ):
+            main_df = pd.DataFrame.from_records(items)
+            main_df['LastUpdated'] = datetime.now()
+            return {key_name: _use_arrow_strings(_process_dates_in_df(main_df))}
+
         # Main DataFrame
-        main_df = pd.json_normalize(items, record_path=None, meta_prefix='meta_')
+        if key_name in _FLATTENED_ENDPOINTS:
+            main_df = pd.DataFrame(_flatten_records(items), copy=False)
+        else:
+            main_df = pd.json_normalize(items, record_path=None, meta_prefix='meta_')
         if main_df.empty:
             return {}
             
@@ -179,7 +392,8 @@ def normalize_data(data, key_name, parent_id_name=None, parent_df=None):
 
         result_dfs = {key_name: main_df}
 
-        # Expand nested columns
+        # Work out which nested columns can be expanded and how they link back
+        active_rules = []
         for col, (parent_id, suffix) in expand_rules.items():
             if col in main_df.columns:
                 # Create a unique ID for the parent if it doesn't exist
@@ -190,140 +404,328 @@ def normalize_data(data, key_name, parent_id_name=None, parent_df=None):
                          continue # Cannot link back, so skip expansion
                 else:
                     parent_id_field = parent_id
+                active_rules.append((col, parent_id_field, suffix))
 
-                # Explode the nested list and normalize it
-                expanded_df = main_df[[parent_id_field, col]].explode(col).dropna()
-                if not expanded_df.empty:
-                    normalized_child = pd.json_normalize(expanded_df[col])
-                    
-                    # Add the parent ID for relationship
-                    normalized_child[parent_id_field] = expanded_df[parent_id_field].values
-                    
-                    # Clean up and add to results
-                    normalized_child = _process_dates_in_df(normalized_child)
-                    result_dfs[f"{key_name}_{suffix}"] = normalized_child
+        # Collect child rows for every rule in a single pass over the raw items
+        child_rows = {col: [] for col, _, _ in active_rules}
+        child_parents = {col: [] for col, _, _ in active_rules}
+        for row in items:
+            if not isinstance(row, dict):
+                continue
+            for col, parent_id_field, _ in active_rules:
+                children = row.get(col)
+                parent_value = row.get(parent_id_field)
+                if children is None or parent_value is None:
+                    continue
+                if not isinstance(children, list):
+                    children = [children]
+                for child in children:
+                    if child is not None:
+                        child_rows[col].append(child)
+                        child_parents[col].append(parent_value)
+
+        for col, parent_id_field, suffix in active_rules:
+            if child_rows[col]:
+                normalized_child = pd.json_normalize(child_rows[col])
+                
+                # Add the parent ID for relationship
+                normalized_child[parent_id_field] = child_parents[col]
+                
+                # Clean up and add to results
+                normalized_child = _process_dates_in_df(normalized_child)
+                result_dfs[f"{key_name}_{suffix}"] = normalized_child
 
-                # Drop the original complex column from the main df
-                main_df.drop(columns=[col], inplace=True)
+            # Drop the original complex column from the main df
+            main_df.drop(columns=[col], inplace=True)
         
         # Convert any remaining complex columns to JSON strings as a fallback
         for col_name in main_df.select_dtypes(include=['object']).columns:
-            if any(isinstance(i, (dict, list)) for i in main_df[col_name].dropna()):
-                 main_df[col_name] = main_df[col_name].apply(lambda x: json.dumps(x) if isinstance(x, (dict, list)) else x)
+            values = main_df[col_name].to_numpy()
+            needs = [i for i, v in enumerate(values) if isinstance(v, (dict, list))]
+            if needs:
+                values = values.copy()
+                for i in needs:
+                    values[i] = _json_dumps(values[i])
+                main_df[col_name] = values
 
-
-        return result_dfs
+        return {name: _use_arrow_strings(df) for name, df in result_dfs.items()}
 
     except Exception as e:
-        import traceback
         print(f"Error normalizing {key_name}: {str(e)}")
         traceback.print_exc()
         return {}
 
 
+# Cheap prefix check used to decide whether a column is worth parsing as dates
+_ISO_DATE_RE = re.compile(r'^\d{4}-\d{2}-\d{2}')
+
+# Number of non-null values inspected before attempting a full parse
+DATE_SAMPLE_SIZE = 20
+
 def _process_dates_in_df(df: pd.DataFrame) -> pd.DataFrame:
-    """Converts object columns that look like dates to datetime and formats them."""
-    for col in df.columns:
-        # Check if column is of object type (likely strings)
-        if df[col].dtype == 'object':
-            # Attempt to convert to datetime
-            try:
-                # Use errors='coerce' to turn unparseable dates into NaT (Not a Time)
-                temp_series = pd.to_datetime(df[col], errors='coerce')
-                
-                # If a significant portion of the column was converted, assume it's a date column
-                # and replace original with formatted strings
-                if temp_series.count() / len(df) > 0.5: # More than 50% successfully converted
-                    df[col] = temp_series.dt.strftime('%Y-%m-%d')
-            except Exception:
-                # If conversion fails, leave the column as is
-                pass
+    """Converts known Xero date columns holding ISO dates to '%Y-%m-%d' strings.
+    
+    The values stay strings so every consumer of normalize_data (CSV export,
+    get_credit_transactions, callers using the frames directly) sees the same
+    type it always has.
+    """
+    # Only the known Xero date fields (see xero_date_fields) are worth parsing
+    for col in date_columns(df.columns):
+        if df[col].dtype != 'object':
+            continue
+        
+        # Only parse the whole column if a small sample looks like ISO dates
+        sample = df[col].dropna().head(DATE_SAMPLE_SIZE)
+        if sample.empty or not all(isinstance(v, str) and _ISO_DATE_RE.match(v) for v in sample):
+            continue
+        
+        # Use errors='coerce' to turn unparseable dates into NaT (Not a Time)
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore')
+            temp_series = pd.to_datetime(df[col], errors='coerce', format='ISO8601', cache=True)
+        
+        # If a significant portion of the column was converted, assume it's a date column
+        # and replace original with formatted strings
+        if temp_series.count() / len(df) > 0.5: # More than 50% successfully converted
+            df[col] = temp_series.dt.strftime('%Y-%m-%d')
     return df
 
 START_DATE = "2025-01-01T00:00:00"
 END_DATE = "2025-02-28T23:59:59"
 DATE_FILTER = START_DATE  # For backward compatibility
 
-def make_paginated_api_call(url, description="API Call", date_param="ModifiedAfter", key_name=None, params=None):
+# Pages requested at once while paginating; Xero allows 5 concurrent calls per tenant
+PAGE_WINDOW = 5
+
+def _fetch_page(url, params, page):
+    """Fetch a single page of results"""
+    request_params = params.copy()
+    request_params['page'] = page
+    
+    response = _get(
+        url,
+        headers=get_headers(),
+        params=request_params
+    )
+    response.raise_for_status()
+    return _parse_json(response)
+
+def _extract_items(data, key_name):
+    """Pull the list of records out of a page, handling different response formats"""
+    if key_name and key_name in data:
+        return data[key_name]
+    if isinstance(data, list):
+        return data
+    return data.get('items', [])
+
+def _get_total_count(url, params, description):
+    """Ask for a single record to read the x-total-count header, 0 if unavailable"""
+    try:
+        count_params = params.copy()
+        count_params['page'] = 1
+        count_params['pageSize'] = 1
+        
+        response = _get(
+            url,
+            headers=get_headers(),
+            params=count_params
+        )
+        response.raise_for_status()
+        return int(response.headers.get('x-total-count', 0))
+    except Exception as e:
+        print(f"⚠️ Could not get total count for {description}: {str(e)}")
+        return 0
+
+def _fetch_all_pages(url, params, n_pages, description, key_name):
+    """Request every page at once and return the items in page order
+    
+    If any page fails, the first error is re-raised once the other pages have
+    finished, so a partial result is never mistaken for the whole endpoint.
+    """
+    pages = {}
+    failed = {}
+    
+    # _get keeps the number of requests in flight within Xero's limit
+    with ThreadPoolExecutor(max_workers=PAGE_WINDOW) as executor:
+        futures = {
+            executor.submit(_fetch_page, url, params, page): page
+            for page in range(1, n_pages + 1)
+        }
+        for future in as_completed(futures):
+            page = futures[future]
+            try:
+                pages[page] = _extract_items(future.result() or {}, key_name)
+            except requests.exceptions.RequestException as e:
+                print(f"❌ Error fetching {description} (Page {page}): {str(e)}")
+                if e.response is not None:
+                    print(f"  - Status: {e.response.status_code}")
+                    if e.response.text:
+                        print(f"  - Response: {e.response.text[:500]}")
+                failed[page] = e
+                continue
+            except Exception as e:
+                print(f"❌ Unexpected error on {description} page {page}: {str(e)}")
+                failed[page] = e
+                continue
+            
+            log.debug(f"  - Fetched {len(pages[page])} items ({description} page {page}/{n_pages})")
+    
+    if failed:
+        print(f"❌ {description}: {len(failed)} of {n_pages} pages failed ({sorted(failed)})")
+        raise failed[min(failed)]
+    
+    # Flatten in page order so any requested ordering is preserved
+    return [item for page in sorted(pages) for item in pages[page]]
+
+def make_paginated_api_call(url, description="API Call", date_param="ModifiedAfter", key_name=None, params=None,
+                            use_total_count=False):
+    """
+    Fetch every page of a list endpoint and return the raw items
+    
+    With use_total_count=True the x-total-count header is read first so all
+    pages can be requested at once; otherwise pages are walked in windows of
+    PAGE_WINDOW until a short page comes back.
+    
+    A page that fails to load raises rather than returning the items fetched
+    so far.
+    """
     all_items = []
     page = 1
-    page_size = 100  # Default page size
     
     # Initialize params if not provided
     if params is None:
         params = {}
+    page_size = params.get('pageSize', 100)  # Default page size
     
     # Add date range filter if supported and not already in params
     if date_param and date_param not in params:
         params[date_param] = START_DATE
     
-    while True:
-        try:
-            # Prepare request parameters
-            request_params = params.copy()
-            request_params['page'] = page
-            
-            # Make the API call
-            print(f"Fetching: {description} (Page {page})")
-            response = requests.get(
-                url,
-                headers=get_headers(),
-                params=request_params
-            )
-            response.raise_for_status()
-            
-            data = response.json()
-            
-            # Handle different response formats
-            if key_name and key_name in data:
-                items = data[key_name]
-            elif isinstance(data, list):
-                items = data
-            else:
-                items = data.get('items', [])
+    if use_total_count:
+        total_count = _get_total_count(url, params, description)
+        if total_count:
+            all_items = _fetch_all_pages(url, params, math.ceil(total_count / page_size), description, key_name)
+            log.info(f"✅ Fetched {len(all_items)} total items for {description}")
+            return all_items
+    
+    # Page 1 is fetched on its own so small endpoints only cost one request.
+    # Once a full page comes back, the following pages are requested
+    # PAGE_WINDOW at a time and consumed in order until a short page is seen.
+    window = 1
+    done = False
+    
+    with ThreadPoolExecutor(max_workers=PAGE_WINDOW) as executor:
+        while not done:
+            pages = range(page, page + window)
+            log.debug(f"Fetching: {description} (Page {page}{f'-{pages[-1]}' if window > 1 else ''})")
+            futures = [executor.submit(_fetch_page, url, params, p) for p in pages]
             
-            if not items:
-                print(f"No more items found for {description}")
-                break
+            for p, future in zip(pages, futures):
+                try:
+                    items = _extract_items(future.result(), key_name)
+                except requests.exceptions.RequestException as e:
+                    print(f"❌ Error fetching {description} (Page {p}): {str(e)}")
+                    if e.response is not None:
+                        print(f"  - Status: {e.response.status_code}")
+                        if e.response.text:
+                            print(f"  - Response: {e.response.text[:500]}")
+                    # Returning the pages before this one would look like a complete result
+                    raise
+                except Exception as e:
+                    print(f"❌ Unexpected error: {str(e)}")
+                    traceback.print_exc()
+                    raise
                 
-            all_items.extend(items)
-            print(f"  - Fetched {len(items)} items (Total: {len(all_items)})")
-            
-            # Check if we've reached the last page
-            if len(items) < page_size:
-                break
-            
-            # Move to next page
-            page += 1
-            
-            # Be kind to the API - add a small delay between requests
-            time.sleep(0.5)
-            
-        except requests.exceptions.RequestException as e:
-            print(f"❌ Error fetching {description} (Page {page}): {str(e)}")
-            if hasattr(e, 'response') and e.response:
-                print(f"  - Status: {e.response.status_code}")
-                if e.response.text:
-                    print(f"  - Response: {e.response.text[:500]}")
-            
-            # If it's a rate limit error, wait and retry
-            if hasattr(e, 'response') and e.response.status_code == 429:
-                retry_after = int(e.response.headers.get('Retry-After', 5))
-                print(f"  ⏳ Rate limited. Waiting {retry_after} seconds...")
-                time.sleep(retry_after)
-                continue
+                if not items:
+                    log.debug(f"No more items found for {description}")
+                    done = True
+                    break
                 
-            # For other errors, break the loop
-            break
-        except Exception as e:
-            print(f"❌ Unexpected error: {str(e)}")
-            import traceback
-            traceback.print_exc()
-            break
+                all_items.extend(items)
+                log.debug(f"  - Fetched {len(items)} items (Total: {len(all_items)})")
+                
+                # Check if we've reached the last page
+                if len(items) < page_size:
+                    done = True
+                    break
+            
+            page += window
+            window = PAGE_WINDOW
     
-    print(f"✅ Fetched {len(all_items)} total items for {description}")
+    log.info(f"✅ Fetched {len(all_items)} total items for {description}")
     return all_items
 
+# Raw records of slow-changing endpoints, kept between runs so later exports
+# only ask Xero for what changed since the last one
+CACHE_FILE = os.path.join('xero_data', '.cache.json')
+_cache_lock = threading.Lock()
+
+def _load_cache():
+    try:
+        with open(CACHE_FILE, 'rb') as f:
+            return orjson.loads(f.read()) if orjson is not None else json.load(f)
+    except (FileNotFoundError, ValueError):
+        return {}
+
+def _save_cache(cache):
+    """Replace CACHE_FILE via a temp file, so a crash mid-write never corrupts it"""
+    os.makedirs(os.path.dirname(CACHE_FILE), exist_ok=True)
+    tmp_path = f"{CACHE_FILE}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(_json_dumps(cache).encode('utf-8'))
+    os.replace(tmp_path, CACHE_FILE)
+
+def _cache_key(url):
+    # Entries are per organisation, so another tenant's fetched_at is never
+    # sent as If-Modified-Since
+    return f"{TENANT_ID}:{url}"
+
+def make_conditional_api_call(url, description="API Call", key_name=None, id_field=None):
+    """
+    Fetch a slow-changing list endpoint using If-Modified-Since
+    
+    Xero answers a conditional request with only the records modified since
+    the given time (or 304 if nothing changed), which are merged by id_field
+    into the records cached from the previous run. Records deleted in Xero
+    stay in the cache; delete CACHE_FILE to force a full refresh.
+    """
+    with _cache_lock:
+        entry = _load_cache().get(_cache_key(url))
+    
+    headers = dict(get_headers())
+    if entry:
+        headers['If-Modified-Since'] = entry['fetched_at']
+    
+    # Stamp the cache with the time the request was made, so nothing changed
+    # while it was in flight gets skipped next time
+    fetched_at = formatdate(usegmt=True)
+    try:
+        log.info(f"Fetching: {description}")
+        response = _get(url, headers=headers)
+        if response.status_code == 304:
+            log.info(f"✅ {description} unchanged, using {len(entry['items'])} cached items")
+            return entry['items']
+        response.raise_for_status()
+        changed = _extract_items(_parse_json(response), key_name)
+    except requests.exceptions.RequestException as e:
+        print(f"❌ Error fetching {description}: {str(e)}")
+        return entry['items'] if entry else []
+    
+    if entry:
+        merged = {item.get(id_field): item for item in entry['items']}
+        merged.update((item.get(id_field), item) for item in changed)
+        items = list(merged.values())
+        log.info(f"✅ {len(changed)} changed {description} merged into {len(items)} cached items")
+    else:
+        items = changed
+        log.info(f"✅ Fetched {len(items)} total items for {description}")
+    
+    with _cache_lock:
+        cache = _load_cache()
+        cache[_cache_key(url)] = {'fetched_at': fetched_at, 'items': items}
+        _save_cache(cache)
+    return items
+
 def make_api_call_with_date(url, description="API Call", date_param="ModifiedAfter"):
     """Make API call with date range filtering"""
     try:
@@ -336,16 +738,16 @@ def make_api_call_with_date(url, description="API Call", date_param="ModifiedAft
         else:
             filtered_url = f"{url}?{date_param}={START_DATE}"
             
-        response = requests.get(filtered_url, headers=get_headers())
+        response = _get(filtered_url, headers=get_headers())
         
         # If date filter fails, try without it
         if response.status_code == 400:
             print(f"Date filter not supported for {description}, getting all records...")
-            response = requests.get(url, headers=get_headers())
+            response = _get(url, headers=get_headers())
             
         response.raise_for_status()
         
-        data = response.json()
+        data = _parse_json(response)
         print(f"✅ Success: {description}")
         return data
     except requests.exceptions.RequestException as e:
@@ -356,16 +758,26 @@ def make_api_call_with_date(url, description="API Call", date_param="ModifiedAft
 # MAIN DATA RETRIEVAL FUNCTIONS WITH DATE FILTERING
 # =============================================================================
 
+# BankTransactions types that represent money credited back rather than spent or received
+_BANK_CREDIT_TYPES = ('SPEND-OVERPAYMENT', 'SPEND-PREPAYMENT', 'SPEND-REFUND',
+                      'RECEIVE-OVERPAYMENT', 'RECEIVE-PREPAYMENT', 'RECEIVE-REFUND')
+
 def get_credit_transactions():
     """Fetch all credit transactions including credit notes and bank transfers"""
     # Get credit notes
-    credit_notes_url = f"{BASE_URLS['accounting']}/CreditNotes"
-    credit_notes = make_api_call(credit_notes_url, "Credit Notes")
+    credit_notes = normalize_data(
+        make_paginated_api_call(f"{BASE_URLS['accounting']}/CreditNotes", "Credit Notes", key_name='CreditNotes'),
+        'CreditNotes'
+    ).get('CreditNotes')
     
-    # Get bank transactions (filter for credits)
-    credit_types = "SPEND-OVERPAYMENT,SPEND-PREPAYMENT,SPEND-REFUND,RECEIVE-OVERPAYMENT,RECEIVE-PREPAYMENT,RECEIVE-REFUND"
-    bank_transactions_url = f"{BASE_URLS['accounting']}/BankTransactions?where=Type==\"{credit_types}\""
-    bank_transactions = make_api_call(bank_transactions_url, "Bank Credit Transactions")
+    # Get bank transactions (filter for credits). Xero's where clause has no
+    # IN operator, so each type is its own comparison joined with OR
+    credit_filter = ' OR '.join(f'Type=="{t}"' for t in _BANK_CREDIT_TYPES)
+    bank_transactions = normalize_data(
+        make_paginated_api_call(f"{BASE_URLS['accounting']}/BankTransactions", "Bank Credit Transactions",
+                                key_name='BankTransactions', params={'where': credit_filter}),
+        'BankTransactions'
+    ).get('BankTransactions')
     
     # Combine and process the data
     all_credits = []
@@ -387,6 +799,16 @@ def get_contacts():
     data = make_paginated_api_call(f"{BASE_URLS['accounting']}/Contacts", "Contacts", key_name='Contacts')
     return normalize_data(data, 'Contacts')
 
+# Invoice fields converted by get_invoices after normalizing
+_INVOICE_NUMERIC_COLUMNS = ('SubTotal', 'TotalTax', 'Total', 'AmountDue', 'AmountPaid',
+                            'AmountCredited', 'CurrencyRate')
+
+# Xero's legacy date format is /Date(1735689600000+0000)/. The milliseconds since
+# epoch follow the prefix, may be negative or shorter than 13 digits, and the
+# offset is optional, so the number is matched rather than sliced
+_XERO_DATE_PREFIX = '/Date('
+_XERO_DATE_MS_RE = re.compile(r'^/Date\((-?\d+)')
+
 def get_invoices(summary_only=False, page_size=100):
     """
     Get all invoices (since Jan 1, 2025) with full details including line items and payments
@@ -398,9 +820,6 @@ def get_invoices(summary_only=False, page_size=100):
     Returns:
         DataFrame: Pandas DataFrame containing invoice data with nested fields preserved as dictionaries/lists
     """
-    import pandas as pd
-    from tqdm import tqdm
-    
     base_url = f"{BASE_URLS['accounting']}/Invoices"
     params = {
         'where': 'Date >= DateTime(2025, 1, 1)',
@@ -413,128 +832,67 @@ def get_invoices(summary_only=False, page_size=100):
     else:
         params['summaryOnly'] = 'true'    # Lightweight version
     
-    print(f"Fetching invoices (page size: {params['pageSize']})...")
-    
-    # First, get the total count to show progress
-    try:
-        test_params = params.copy()
-        test_params['page'] = 1
-        test_params['pageSize'] = 1
-        
-        response = requests.get(
-            base_url,
-            headers=get_headers(),
-            params=test_params
-        )
-        response.raise_for_status()
-        total_count = int(response.headers.get('x-total-count', 0))
-    except Exception as e:
-        print(f"⚠️ Could not get total count: {str(e)}")
-        total_count = 0
+    log.info(f"Fetching invoices (page size: {params['pageSize']})...")
     
-    # Fetch all pages with progress bar
-    all_invoices = []
-    page = 1
-    
-    with tqdm(total=total_count or None, desc="Fetching invoices", unit="invoice") as pbar:
-        while True:
-            try:
-                page_params = params.copy()
-                page_params['page'] = page
-                
-                response = requests.get(
-                    base_url,
-                    headers=get_headers(),
-                    params=page_params
-                )
-                response.raise_for_status()
-                
-                data = response.json()
-                if not data or 'Invoices' not in data or not data['Invoices']:
-                    break
-                    
-                all_invoices.extend(data['Invoices'])
-                fetched = len(data['Invoices'])
-                pbar.update(fetched)
-                
-                if fetched < params['pageSize']:
-                    break  # Last page
-                    
-                page += 1
-                
-                # Be kind to the API
-                time.sleep(0.5)
-                
-            except requests.exceptions.RequestException as e:
-                print(f"\n⚠️ Error fetching page {page}: {str(e)}")
-                if hasattr(e, 'response') and e.response is not None:
-                    print(f"Status code: {e.response.status_code}")
-                    print(f"Response: {e.response.text[:500]}")
-                break
-            except Exception as e:
-                print(f"\n⚠️ Unexpected error on page {page}: {str(e)}")
-                break
+    all_invoices = make_paginated_api_call(
+        base_url, "Invoices", date_param=None, key_name='Invoices', params=params, use_total_count=True
+    )
     
     if not all_invoices:
-        print("No invoice data returned from API")
+        log.info("No invoice data returned from API")
         return pd.DataFrame()
     
-    print(f"\nProcessing {len(all_invoices)} invoices...")
-    
-    # Convert to DataFrame with better memory management
-    chunks = []
-    chunk_size = 1000  # Process in chunks to manage memory
+    log.info(f"Processing {len(all_invoices)} invoices...")
     
-    for i in range(0, len(all_invoices), chunk_size):
-        chunk = all_invoices[i:i + chunk_size]
-        df_chunk = pd.json_normalize(chunk, sep='.', errors='ignore')
-        chunks.append(df_chunk)
+    # Convert to DataFrame in one pass; chunking and concatenating only added copies
+    df = pd.json_normalize(all_invoices, sep='.', errors='ignore')
     
-    # Combine chunks
-    df = pd.concat(chunks, ignore_index=True)
+    # Release the raw records now so they aren't held alongside the frame
+    # through the date and numeric conversions below
+    del all_invoices
     
     # Convert date fields with better error handling
-    date_columns = ['Date', 'DueDate', 'FullyPaidOnDate', 'ExpectedPaymentDate', 
-                   'PlannedPaymentDate', 'UpdatedDateUTC', 'DateString', 'DueDateString']
+    # Only look at the invoice's own (top-level) date columns, and only
+    # those that still hold strings
+    present = set(df.columns)
+    cols_present = [col for col in date_columns(df.columns) if '.' not in col and df[col].dtype == 'object']
     
-    for col in date_columns:
-        if col in df.columns and not df[col].empty:
-            try:
-                # Skip if already datetime
-                if pd.api.types.is_datetime64_any_dtype(df[col]):
-                    continue
-                    
-                # Convert object/string columns
-                if df[col].dtype == 'object':
-                    # Handle Xero's /Date(123456789+0000)/ format
-                    if df[col].astype(str).str.contains(r'^/Date\(\d+[+-]\d+\)/$', na=False).any():
-                        # Extract timestamp part (milliseconds since epoch)
-                        df[col] = pd.to_datetime(
-                            df[col].str.extract(r'/Date\((\d+)', expand=False),
-                            unit='ms',
-                            errors='coerce'
-                        )
-                    # Handle ISO format strings
-                    else:
-                        df[col] = pd.to_datetime(df[col], errors='coerce')
-            except Exception as e:
-                print(f"⚠️ Error processing {col}: {str(e)}")
+    for col in cols_present:
+        try:
+            # Xero uses one format per field, so the first value decides the branch
+            sample = df[col].dropna().head(1)
+            is_xero_date = len(sample) and isinstance(sample.iloc[0], str) and sample.iloc[0].startswith(_XERO_DATE_PREFIX)
+            
+            # Handle Xero's /Date(123456789+0000)/ format
+            if is_xero_date:
+                ms = df[col].str.extract(_XERO_DATE_MS_RE, expand=False)
+                df[col] = pd.to_datetime(pd.to_numeric(ms, errors='coerce'), unit='ms', errors='coerce')
+            # Handle ISO format strings
+            else:
+                df[col] = pd.to_datetime(df[col], errors='coerce')
+        except Exception as e:
+            print(f"⚠️ Error processing {col}: {str(e)}")
     
     # Convert numeric fields
-    numeric_columns = ['SubTotal', 'TotalTax', 'Total', 'AmountDue', 'AmountPaid', 
-                      'AmountCredited', 'CurrencyRate']
-    
-    for col in numeric_columns:
-        if col in df.columns:
+    # Amounts stay float64: float32 keeps each cent value but drifts once
+    # thousands of them are summed
+    # memory_usage(deep=True) walks every string, so only measure when debugging
+    measure_memory = log.isEnabledFor(logging.DEBUG)
+    if measure_memory:
+        memory_before = df.memory_usage(deep=True).sum()
+    for col in _INVOICE_NUMERIC_COLUMNS:
+        if col in present:
             try:
                 df[col] = pd.to_numeric(df[col], errors='coerce')
             except Exception as e:
                 print(f"⚠️ Error converting {col} to numeric: {str(e)}")
+    if measure_memory:
+        memory_after = df.memory_usage(deep=True).sum()
+        log.debug(f"Invoice memory: {memory_before / 1e6:.1f} MB -> {memory_after / 1e6:.1f} MB")
     
-    # Clean up memory
-    del all_invoices
+    df = _use_arrow_strings(df)
     
-    print(f"✅ Successfully processed {len(df)} invoices")
+    log.info(f"✅ Successfully processed {len(df)} invoices")
     return df
 
 def get_invoice_summaries():
@@ -566,9 +924,25 @@ def get_receipts():
     data = make_paginated_api_call(f"{BASE_URLS['accounting']}/Receipts", "Receipts", key_name='Receipts')
     return normalize_data(data, 'Receipts')
 
+def get_purchase_orders():
+    """Get purchase orders (dated since Jan 1, 2025)"""
+    # PurchaseOrders filters on DateFrom (YYYY-MM-DD) rather than ModifiedAfter
+    data = make_paginated_api_call(f"{BASE_URLS['accounting']}/PurchaseOrders", "Purchase Orders",
+                                   date_param=None, key_name='PurchaseOrders',
+                                   params={'DateFrom': START_DATE[:10]})
+    return normalize_data(data, 'PurchaseOrders')
+
+def get_quotes():
+    """Get quotes (dated since Jan 1, 2025)"""
+    # Quotes filters on DateFrom (YYYY-MM-DD) rather than ModifiedAfter
+    data = make_paginated_api_call(f"{BASE_URLS['accounting']}/Quotes", "Quotes",
+                                   date_param=None, key_name='Quotes',
+                                   params={'DateFrom': START_DATE[:10]})
+    return normalize_data(data, 'Quotes')
+
 def get_accounts():
     """Get chart of accounts"""
-    data = make_paginated_api_call(f"{BASE_URLS['accounting']}/Accounts", "Chart of Accounts", key_name='Accounts', date_param=None)
+    data = make_conditional_api_call(f"{BASE_URLS['accounting']}/Accounts", "Chart of Accounts", key_name='Accounts', id_field='AccountID')
     return normalize_data(data, 'Accounts')
 
 def get_organisation():
@@ -578,7 +952,7 @@ def get_organisation():
 
 def get_items():
     """Get inventory items"""
-    data = make_paginated_api_call(f"{BASE_URLS['accounting']}/Items", "Items", key_name='Items', date_param=None)
+    data = make_conditional_api_call(f"{BASE_URLS['accounting']}/Items", "Items", key_name='Items', id_field='ItemID')
     return normalize_data(data, 'Items')
 
 def get_tax_rates():
@@ -641,10 +1015,38 @@ def get_trial_balance_report():
     data = make_api_call(f"{BASE_URLS['accounting']}/Reports/TrialBalance?date=2025-02-28", "Trial Balance Report")
     return normalize_data(data, 'Reports', 'ReportID')
 
+def _memoize_statement(fetch):
+    """Memoize a finance statement fetcher, handing each caller its own copy.
+    
+    Xero fills in omitted dates relative to today, so calls that leave a date
+    to its default are cached under today's date and fetched again tomorrow.
+    """
+    signature = inspect.signature(fetch)
+    
+    @lru_cache(maxsize=64)
+    def cached(args, as_of):
+        return fetch(*args)
+    
+    @wraps(fetch)
+    def wrapper(*args, **kwargs):
+        bound = signature.bind(*args, **kwargs)
+        bound.apply_defaults()
+        args = tuple(bound.arguments.values())
+        as_of = date.today().isoformat() if None in args else None
+        return copy.deepcopy(cached(args, as_of))
+    
+    wrapper.cache_clear = cached.cache_clear
+    return wrapper
+
+@_memoize_statement
 def get_profit_and_loss(start_date=None, end_date=None):
     """
     Get Profit & Loss statement from Xero Finance API
     
+    Results are memoized for the life of the process (for the day, when a
+    date is left to its default);
+    call get_profit_and_loss.cache_clear() to force a fresh fetch.
+    
     Args:
         start_date (str): Start date in format 'YYYY-MM-DD'. Defaults to 12 months before end_date.
         end_date (str): End date in format 'YYYY-MM-DD'. Defaults to current date.
@@ -663,10 +1065,10 @@ def get_profit_and_loss(start_date=None, end_date=None):
             params['endDate'] = end_date
             
         url = f"{BASE_URLS['finance']}/financialstatements/profitandloss"
-        print(f"Fetching P&L from {url} with params: {params}")
+        log.info(f"Fetching P&L from {url} with params: {params}")
         
         headers = get_headers()
-        response = requests.get(
+        response = _get(
             url,
             headers=headers,
             params=params,
@@ -674,12 +1076,12 @@ def get_profit_and_loss(start_date=None, end_date=None):
         )
         
         # Log response status and headers for debugging
-        print(f"Response status: {response.status_code}")
-        print(f"Response headers: {dict(response.headers)}")
+        log.debug("Response status: %s", response.status_code)
+        log.debug("Response headers: %s", response.headers)
         
         response.raise_for_status()
-        data = response.json()
-        print(f"Successfully fetched P&L data")
+        data = _parse_json(response)
+        log.info("Successfully fetched P&L data")
         return data
         
     except requests.exceptions.RequestException as e:
@@ -693,10 +1095,15 @@ def get_profit_and_loss(start_date=None, end_date=None):
         print(error_msg)
         raise Exception(error_msg) from e
 
+@_memoize_statement
 def get_balance_sheet(balance_date=None):
     """
     Get Balance Sheet from Xero Finance API
     
+    Results are memoized for the life of the process (for the day, when a
+    date is left to its default);
+    call get_balance_sheet.cache_clear() to force a fresh fetch.
+    
     Args:
         balance_date (str): Date in format 'YYYY-MM-DD'. Defaults to current date.
         
@@ -712,10 +1119,10 @@ def get_balance_sheet(balance_date=None):
             params['balanceDate'] = balance_date
             
         url = f"{BASE_URLS['finance']}/financialstatements/balancesheet"
-        print(f"Fetching Balance Sheet from {url} with params: {params}")
+        log.info(f"Fetching Balance Sheet from {url} with params: {params}")
         
         headers = get_headers()
-        response = requests.get(
+        response = _get(
             url,
             headers=headers,
             params=params,
@@ -723,12 +1130,12 @@ def get_balance_sheet(balance_date=None):
         )
         
         # Log response status and headers for debugging
-        print(f"Response status: {response.status_code}")
-        print(f"Response headers: {dict(response.headers)}")
+        log.debug("Response status: %s", response.status_code)
+        log.debug("Response headers: %s", response.headers)
         
         response.raise_for_status()
-        data = response.json()
-        print("Successfully fetched Balance Sheet data")
+        data = _parse_json(response)
+        log.info("Successfully fetched Balance Sheet data")
         return data
         
     except requests.exceptions.RequestException as e:
@@ -742,10 +1149,15 @@ def get_balance_sheet(balance_date=None):
         print(error_msg)
         raise Exception(error_msg) from e
 
+@_memoize_statement
 def get_cash_flow(start_date=None, end_date=None):
     """
     Get Cash Flow statement from Xero Finance API
     
+    Results are memoized for the life of the process (for the day, when a
+    date is left to its default);
+    call get_cash_flow.cache_clear() to force a fresh fetch.
+    
     Args:
         start_date (str): Start date in format 'YYYY-MM-DD'. Defaults to 12 months before end_date.
         end_date (str): End date in format 'YYYY-MM-DD'. Defaults to current date.
@@ -764,10 +1176,10 @@ def get_cash_flow(start_date=None, end_date=None):
             params['endDate'] = end_date
             
         url = f"{BASE_URLS['finance']}/financialstatements/cashflow"
-        print(f"Fetching Cash Flow from {url} with params: {params}")
+        log.info(f"Fetching Cash Flow from {url} with params: {params}")
         
         headers = get_headers()
-        response = requests.get(
+        response = _get(
             url,
             headers=headers,
             params=params,
@@ -775,12 +1187,12 @@ def get_cash_flow(start_date=None, end_date=None):
         )
         
         # Log response status and headers for debugging
-        print(f"Response status: {response.status_code}")
-        print(f"Response headers: {dict(response.headers)}")
+        log.debug("Response status: %s", response.status_code)
+        log.debug("Response headers: %s", response.headers)
         
         response.raise_for_status()
-        data = response.json()
-        print("Successfully fetched Cash Flow data")
+        data = _parse_json(response)
+        log.info("Successfully fetched Cash Flow data")
         return data
         
     except requests.exceptions.RequestException as e:
@@ -840,6 +1252,57 @@ def get_projects():
 # CSV EXPORT FUNCTIONS
 # =============================================================================
 
+def _json_default(value):
+    """Serialize the pandas/numpy values that JSON encoders don't know about"""
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    if isinstance(value, np.generic):
+        return value.item()
+    if pd.isna(value):
+        return None
+    raise TypeError(f"Type is not JSON serializable: {type(value).__name__}")
+
+def _json_dumps(value):
+    """Compact JSON string for a single nested value"""
+    if orjson is not None:
+        return orjson.dumps(
+            value,
+            default=_json_default,
+            option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NAIVE_UTC
+        ).decode('utf-8')
+    return json.dumps(value, default=_json_default)
+
+def serialize_json(data):
+    """Serialize data to indented JSON bytes, using orjson when available"""
+    if orjson is not None:
+        return orjson.dumps(data, option=orjson.OPT_INDENT_2 | orjson.OPT_SERIALIZE_NUMPY)
+    return json.dumps(data, indent=2).encode('utf-8')
+
+def save_to_json(data, filepath):
+    """Write data to filepath as indented JSON in a single write"""
+    with open(filepath, 'wb') as f:
+        f.write(serialize_json(data))
+    return filepath
+
+def _write_csv(df, filepath, date_format=None):
+    """Write df to filepath, using pyarrow when installed and pandas otherwise"""
+    if pa is not None:
+        out = df
+        if date_format:
+            # Keep the same date strings pandas would have written
+            datetime_cols = out.select_dtypes(include=['datetime', 'datetimetz']).columns
+            if len(datetime_cols):
+                out = out.assign(**{col: out[col].dt.strftime(date_format) for col in datetime_cols})
+        try:
+            pacsv.write_csv(pa.Table.from_pandas(out, preserve_index=False), filepath)
+            return
+        except (pa.ArrowInvalid, pa.ArrowTypeError, pa.ArrowNotImplementedError):
+            # Mixed-type object columns can't become Arrow arrays; let pandas handle them
+            pass
+    df.to_csv(filepath, index=False, encoding='utf-8', date_format=date_format)
+
 def save_to_csv(df, filename, folder="xero_data"):
     """Save DataFrame to CSV with proper handling"""
     import os
@@ -852,7 +1315,7 @@ def save_to_csv(df, filename, folder="xero_data"):
     
     if df is not None and not df.empty:
         try:
-            df.to_csv(filepath, index=False, encoding='utf-8')
+            _write_csv(df, filepath, date_format='%Y-%m-%d')
             print(f"Saved {len(df)} records to {filepath}")
             return filepath
         except Exception as e:
@@ -866,48 +1329,8 @@ def export_super_invoice():
     """
     Export a comprehensive invoice report with all fields exactly as they appear in the API response
     """
-    import pandas as pd
-    import numpy as np
-    from datetime import datetime
-    
     print("\n=== Exporting Raw Invoice Data ===")
     
-    def safe_convert(value):
-        """Safely convert values to JSON-serializable types"""
-        # Handle None values first
-        if value is None:
-            return None
-            
-        # Handle numpy arrays and pandas Series
-        if hasattr(value, 'shape') or isinstance(value, (list, tuple, np.ndarray)):
-            if hasattr(value, 'size') and value.size == 0:
-                return None
-            if hasattr(value, 'size') and value.size == 1:
-                return safe_convert(value.item() if hasattr(value, 'item') else value[0])
-            return [safe_convert(x) for x in value] if len(value) > 0 else None
-            
-        # Handle pandas NA/NaN values
-        try:
-            if pd.isna(value):
-                return None
-        except (ValueError, TypeError):
-            pass
-            
-        # Handle datetime objects
-        if hasattr(value, 'isoformat') and not isinstance(value, (str, bytes, bytearray)):
-            return value.isoformat()
-            
-        # Handle dictionaries and pandas Series
-        if isinstance(value, (dict, pd.Series)):
-            return {str(k): safe_convert(v) for k, v in value.items()}
-            
-        # Handle basic types
-        if isinstance(value, (int, float, str, bool)):
-            return value
-            
-        # Convert any remaining types to string
-        return str(value)
-    
     try:
         # Create output directory if it doesn't exist
         output_dir = 'xero_exports'
@@ -922,30 +1345,28 @@ def export_super_invoice():
             print("❌ No invoices found or error occurred")
             return None
         
-        # Convert DataFrame to list of dicts, handling all data types
-        all_invoices = []
-        for _, row in invoices.iterrows():
-            # Convert each row to a dictionary and process all values
-            invoice_dict = {}
-            for col in invoices.columns:
-                value = row[col]
-                invoice_dict[col] = safe_convert(value)
-            all_invoices.append(invoice_dict)
+        df = invoices
         
-        # Convert to DataFrame with proper handling of nested structures
-        df = pd.json_normalize(all_invoices, sep='.')
+        # Datetime columns become ISO strings in one vectorized pass
+        for col in df.select_dtypes(include=['datetime', 'datetimetz']).columns:
+            df[col] = df[col].dt.strftime('%Y-%m-%dT%H:%M:%S')
         
-        # Ensure all columns are strings to avoid serialization issues
+        # Only columns holding nested lists/dicts need per-cell conversion;
+        # those cells are written out as JSON
         for col in df.select_dtypes(include=['object']).columns:
-            df[col] = df[col].astype(str)
+            values = df[col].dropna()
+            if not values.empty and isinstance(values.iloc[0], (list, tuple, dict, np.ndarray)):
+                df[col] = df[col].map(
+                    lambda v: _json_dumps(v) if isinstance(v, (list, tuple, dict, np.ndarray)) else v
+                )
         
+        # No string cast needed: the CSV writer stringifies object columns itself
         # Save to CSV with proper encoding
-        df.to_csv(output_file, index=False, encoding='utf-8')
+        _write_csv(df, output_file)
         print(f"✅ Successfully exported {len(df)} invoices to {output_file}")
         return output_file
             
     except Exception as e:
-        import traceback
         print(f"❌ Error exporting invoice data: {str(e)}")
         print("Stack trace:")
         traceback.print_exc()
@@ -1005,21 +1426,32 @@ def export_all_to_csv():
 
     # Track processed data to avoid duplicates
     processed_data = {}
-    
+    tasks = []
     for category, functions in all_functions.items():
-        print(f"\n=== {category} ===")
         for func, base_filename in functions:
-            try:
-                # Skip if we've already processed this function
-                if func.__name__ in processed_data:
-                    print(f"- Skipping duplicate function: {func.__name__}")
-                    continue
-                    
-                # Mark this function as processed
-                processed_data[func.__name__] = True
+            # Skip if we've already queued this function
+            if func.__name__ in processed_data:
+                print(f"- Skipping duplicate function: {func.__name__}")
+                continue
                 
-                # Call the function to get data
-                result = func()
+            # Mark this function as processed
+            processed_data[func.__name__] = True
+            tasks.append((category, func, base_filename))
+    
+    # The pulls are independent and I/O bound, so run them side by side. Results
+    # are still handled (and saved) here in the original order; _get keeps the
+    # number of requests in flight within Xero's limit.
+    with ThreadPoolExecutor(max_workers=ENDPOINT_WORKERS) as executor:
+        futures = [(category, executor.submit(func), base_filename) for category, func, base_filename in tasks]
+        
+        current_category = None
+        for category, future, base_filename in futures:
+            if category != current_category:
+                print(f"\n=== {category} ===")
+                current_category = category
+            try:
+                # Wait for the function's data
+                result = future.result()
                 
                 # Handle different return types
                 if result is None:
@@ -1059,7 +1491,6 @@ def export_all_to_csv():
                             print(f"- Exported: {filename} ({len(df)} rows)")
 
             except Exception as e:
-                import traceback
                 print(f"- Error processing {base_filename}: {str(e)}")
                 traceback.print_exc()
 
@@ -1081,52 +1512,96 @@ def export_all_to_csv():
 # POWER BI FRIENDLY FUNCTIONS (Updated)
 # =============================================================================
 
+# Endpoint fetches run side by side; actual HTTP concurrency is still capped by _get
+ENDPOINT_WORKERS = 8
+
+def _run_concurrently(fetchers):
+    """Call each fetcher on a thread pool and return {name: result}
+    
+    A failing fetcher is reported and recorded as an empty DataFrame so the
+    other endpoints still come back. Results keep the order of `fetchers`.
+    """
+    results = {}
+    with ThreadPoolExecutor(max_workers=ENDPOINT_WORKERS) as executor:
+        futures = {executor.submit(fetch): name for name, fetch in fetchers.items()}
+        for future in as_completed(futures):
+            name = futures[future]
+            try:
+                results[name] = future.result()
+            except Exception as e:
+                print(f"❌ Error retrieving {name}: {str(e)}")
+                results[name] = pd.DataFrame()
+    return {name: results[name] for name in fetchers}
+
+def _split_credit_transactions(credits):
+    """Split get_credit_transactions() output back into credit notes and bank credits"""
+    if credits is None or credits.empty or 'TransactionType' not in credits.columns:
+        return pd.DataFrame(), pd.DataFrame()
+    
+    # Each half only needs its own columns, not the other endpoint's
+    split = []
+    for transaction_type in ('CreditNote', 'BankCredit'):
+        part = credits[credits['TransactionType'] == transaction_type]
+        split.append(part.dropna(axis=1, how='all').reset_index(drop=True))
+    return tuple(split)
+
 def get_all_accounting_data():
     """Get all accounting data as a dictionary of DataFrames"""
     print("📊 Retrieving Accounting Data...")
-    return {
-        'Contacts': get_contacts(),
-        'Invoices': get_invoices(),
-        'Bills': get_bills(),
-        'CreditNotes': get_credit_notes(),
-        'BankTransactions': get_bank_transactions(),
-        'ManualJournals': get_manual_journals(),
-        'Journals': get_journals(),
-        'Payments': get_payments(),
-        'Receipts': get_receipts(),
-        'PurchaseOrders': get_purchase_orders(),
-        'Quotes': get_quotes(),
-        'Accounts': get_accounts(),
-        'Items': get_items(),
-        'TaxRates': get_tax_rates(),
-        'Currencies': get_currencies(),
-        'Attachments': get_attachments(),
-        'Budgets': get_budgets(),
-        'Organisation': get_organisation(),
-        'ProfitLossReport': get_profit_loss_report(),
-        'BalanceSheetReport': get_balance_sheet_report(),
-        'TrialBalanceReport': get_trial_balance_report()
-    }
+    data = _run_concurrently({
+        'Contacts': get_contacts,
+        'Invoices': get_invoices,
+        'Bills': get_bills,
+        # Credit notes and bank credits come back together from one pull
+        'CreditTransactions': get_credit_transactions,
+        'ManualJournals': get_manual_journals,
+        'Journals': get_journals,
+        'Payments': get_payments,
+        'Receipts': get_receipts,
+        'PurchaseOrders': get_purchase_orders,
+        'Quotes': get_quotes,
+        'Accounts': get_accounts,
+        'Items': get_items,
+        'TaxRates': get_tax_rates,
+        'Currencies': get_currencies,
+        'Attachments': get_attachments,
+        'Budgets': get_budgets,
+        'Organisation': get_organisation,
+        'ProfitLossReport': get_profit_loss_report,
+        'BalanceSheetReport': get_balance_sheet_report,
+        'TrialBalanceReport': get_trial_balance_report
+    })
+    
+    credit_notes, bank_credits = _split_credit_transactions(data.pop('CreditTransactions'))
+    
+    # Put the split tables back where they used to sit, after Bills
+    result = {}
+    for name, df in data.items():
+        result[name] = df
+        if name == 'Bills':
+            result['CreditNotes'] = credit_notes
+            result['BankTransactions'] = bank_credits
+    return result
 
 def get_all_payroll_data():
     """Get all payroll data as a dictionary of DataFrames"""
     print("💼 Retrieving Payroll Data...")
-    return {
-        'Employees': get_employees(),
-        'PayRuns': get_pay_runs(),
-        'Timesheets': get_timesheets(),
-        'PayrollSettings': get_payroll_settings()
-    }
+    return _run_concurrently({
+        'Employees': get_employees,
+        'PayRuns': get_pay_runs,
+        'Timesheets': get_timesheets,
+        'PayrollSettings': get_payroll_settings
+    })
 
 def get_all_other_data():
     """Get assets, files, and projects data"""
     print("📁 Retrieving Other Data...")
-    return {
-        'Assets': get_assets(),
-        'Files': get_files(),
-        'Folders': get_folders(),
-        'Projects': get_projects()
-    }
+    return _run_concurrently({
+        'Assets': get_assets,
+        'Files': get_files,
+        'Folders': get_folders,
+        'Projects': get_projects
+    })
 
 # =============================================================================
 # MAIN EXECUTION FUNCTIONS FOR POWER BI
@@ -1,5 +1,8 @@
 
 import os
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
 import pandas as pd
 from dotenv import load_dotenv
 from xero_python.api_client import ApiClient
@@ -7,12 +10,72 @@ from xero_python.api_client.configuration import Configuration
 from xero_python.api_client.oauth2 import OAuth2Token
 from xero_python.accounting import AccountingApi
 from xero_python.payrollau import PayrollAuApi # Note: AU payroll, change if you use a different region (e.g., PayrollUkApi, PayrollNzApi)
-from xero_python.exceptions import AccountingBadRequestException
+from xero_python.exceptions import AccountingBadRequestException, ApiException
 from supabase_config import supabase_config
-from token_manager import get_xero_oauth2_token, refresh_xero_oauth2_token
+
+# pyarrow's CSV writer works straight from columnar buffers; fall back to pandas if it isn't installed
+try:
+    import pyarrow as pa
+    import pyarrow.csv as pacsv
+except ImportError:
+    pa = None
+from token_manager import (
+    get_xero_oauth2_token,
+    is_token_expired,
+    refresh_xero_oauth2_token,
+    save_xero_oauth2_token,
+    save_xero_tenant_id,
+)
 
 load_dotenv()
 
+# Endpoints are fetched and upserted side by side; each one is mostly waiting
+# on Xero or Supabase
+MAX_WORKERS = 8
+
+# CSV exports run off the endpoint workers so disk writes overlap the upserts
+CSV_WORKERS = 2
+
+# ApiClient isn't guaranteed thread-safe, so every worker thread builds its own
+_thread_local = threading.local()
+
+# create_table_if_not_exist re-initializes the shared Supabase client
+_table_lock = threading.Lock()
+
+# Every ApiClient shares the first one's urllib3 pool so the worker threads
+# reuse the same kept-alive connections to api.xero.com
+_shared_pool_manager = None
+_pool_lock = threading.Lock()
+
+def build_api_client(client_id, client_secret, token):
+    """Create a Xero ApiClient that always hands out the given token."""
+    global _shared_pool_manager
+    api_client = ApiClient(
+        Configuration(
+            debug=False,
+            oauth2_token=OAuth2Token(client_id=client_id, client_secret=client_secret)
+        ),
+        oauth2_token_getter=lambda: token,
+    )
+    with _pool_lock:
+        if _shared_pool_manager is None:
+            _shared_pool_manager = api_client.rest_client.pool_manager
+        else:
+            api_client.rest_client.pool_manager = _shared_pool_manager
+    return api_client
+
+def get_thread_apis(client_id, client_secret, token):
+    """Returns this thread's Xero API instances, creating them on first use."""
+    apis = getattr(_thread_local, 'apis', None)
+    if apis is None:
+        api_client = build_api_client(client_id, client_secret, token)
+        apis = {
+            'accounting': AccountingApi(api_client),
+            'payroll': PayrollAuApi(api_client), # Using AU payroll
+        }
+        _thread_local.apis = apis
+    return apis
+
 def get_xero_tenant_id(api_client):
     """Gets the Xero tenant ID."""
     token = get_xero_oauth2_token()
@@ -26,59 +89,182 @@ def get_xero_tenant_id(api_client):
             return connection.tenant_id
     raise Exception("No active organisation tenant found.")
 
+# Pages requested at once while paginating an endpoint
+PAGE_WINDOW = 8
+
+# Xero's list endpoints return 100 records per page; a shorter page is the last
+XERO_PAGE_SIZE = 100
+
+# Xero allows 5 concurrent calls and 60 calls a minute per tenant. Every page
+# request holds a concurrency slot while in flight and a rate slot for a minute.
+MAX_CONCURRENT_CALLS = 5
+RATE_LIMIT_CALLS = 55
+RATE_LIMIT_PERIOD = 60
+_call_semaphore = threading.BoundedSemaphore(MAX_CONCURRENT_CALLS)
+_rate_semaphore = threading.BoundedSemaphore(RATE_LIMIT_CALLS)
+
+def _release_rate_slot_later():
+    timer = threading.Timer(RATE_LIMIT_PERIOD, _rate_semaphore.release)
+    timer.daemon = True
+    timer.start()
+
+# Xero answers with these when the tenant ID isn't one the token can access
+# (connection revoked, or the token was issued for another organisation)
+_TENANT_REJECTED_STATUSES = (401, 403)
+
+def is_tenant_rejected(error):
+    """True if Xero turned a call down because of the tenant ID or token."""
+    return isinstance(error, ApiException) and error.status in _TENANT_REJECTED_STATUSES
+
+# (API class, method) -> name of the list attribute holding its records
+_items_keys = {}
+
+def fetch_page(api_call, tenant_id, page=None, **kwargs):
+    """Fetches a single page (or the whole unpaginated result) and returns its records."""
+    if page is not None:
+        kwargs['page'] = page
+
+    _rate_semaphore.acquire()
+    _release_rate_slot_later()
+    with _call_semaphore:
+        result = api_call(xero_tenant_id=tenant_id, **kwargs)
+
+    # Once we know which attribute holds the records, read it straight off the
+    # model and only convert the records, not the whole response
+    cache_key = (api_call.__self__.__class__.__name__, api_call.__name__)
+    items_key = _items_keys.get(cache_key)
+    if items_key is None:
+        data = result.to_dict()
+        items_key = next((key for key, value in data.items() if isinstance(value, list)), None)
+        if items_key is None:
+            return []
+        _items_keys[cache_key] = items_key
+        return data[items_key]
+
+    items = getattr(result, items_key, None) or []
+    return [item.to_dict() if hasattr(item, 'to_dict') else item for item in items]
+
 def fetch_all_records(api_call, tenant_id, paginated=True, **kwargs):
     """Fetches all records from a Xero endpoint, with or without pagination."""
     records = []
     if paginated:
+        # Page 1 is fetched on its own so small endpoints only cost one call.
+        # After a full page, the next PAGE_WINDOW pages are requested together
+        # and appended in page order until a short or empty page shows up.
         page = 1
-        while True:
-            try:
-                if 'payroll' in str(api_call.__self__.__class__).lower():
-                    result = api_call(xero_tenant_id=tenant_id, page=page, **kwargs)
-                else:
-                    result = api_call(xero_tenant_id=tenant_id, page=page, **kwargs)
-
-                data = result.to_dict()
-                
-                items_key = None
-                for key, value in data.items():
-                    if isinstance(value, list):
-                        items_key = key
+        window = 1
+        done = False
+        with ThreadPoolExecutor(max_workers=PAGE_WINDOW) as executor:
+            while not done:
+                pages = range(page, page + window)
+                futures = [executor.submit(fetch_page, api_call, tenant_id, p, **kwargs) for p in pages]
+                for p, future in zip(pages, futures):
+                    try:
+                        items = future.result()
+                    except AccountingBadRequestException as e:
+                        print(f"Error fetching page {p}: {e}")
+                        done = True
+                        break
+                    except Exception as e:
+                        if is_tenant_rejected(e):
+                            # The caller may look the tenant up again and retry
+                            raise
+                        if '404' in str(e):
+                            print(f"Could not fetch from {api_call.__name__}. This can happen if the API is not enabled for your region.")
+                            return []
+                        print(f"An unexpected error occurred during fetch: {e}")
+                        done = True
                         break
-                
-                if not items_key or not data[items_key]:
-                    break
-
-                records.extend(data[items_key])
-                page += 1
-            except AccountingBadRequestException as e:
-                print(f"Error fetching page {page}: {e}")
-                break
-            except Exception as e:
-                if '404' in str(e):
-                    print(f"Could not fetch from {api_call.__name__}. This can happen if the API is not enabled for your region.")
-                    return []
-                print(f"An unexpected error occurred during fetch: {e}")
-                break
+
+                    if not items:
+                        done = True
+                        break
+
+                    records.extend(items)
+                    if len(items) < XERO_PAGE_SIZE:
+                        done = True
+                        break
+
+                page += window
+                window = PAGE_WINDOW
     else:
         try:
-            if 'payroll' in str(api_call.__self__.__class__).lower():
-                result = api_call(xero_tenant_id=tenant_id, **kwargs)
-            else:
-                result = api_call(xero_tenant_id=tenant_id, **kwargs)
-            data = result.to_dict()
-            items_key = None
-            for key, value in data.items():
-                if isinstance(value, list):
-                    items_key = key
-                    break
-            if items_key:
-                records.extend(data[items_key])
+            records.extend(fetch_page(api_call, tenant_id, **kwargs))
         except Exception as e:
+            if is_tenant_rejected(e):
+                raise
             print(f"An unexpected error occurred during fetch: {e}")
 
     return records
 
+def export_csv(df, csv_path):
+    """Writes df to csv_path, with pyarrow when available and pandas otherwise."""
+    if pa is not None:
+        try:
+            table = pa.Table.from_pandas(df, preserve_index=False)
+            pacsv.write_csv(table, csv_path, write_options=pacsv.WriteOptions(include_header=True))
+            return
+        except (pa.ArrowInvalid, pa.ArrowTypeError, pa.ArrowNotImplementedError):
+            # Nested records (lists/dicts) can't be written by the Arrow CSV writer
+            pass
+    df.to_csv(csv_path, index=False)
+
+# Columns named like a Xero date field: the SDK's snake_case keys (date,
+# due_date, updated_date_utc) or the raw API's (DueDate, UpdatedDateUTC)
+_DATE_COLUMN_RE = re.compile(r'(?:^|_)date(?:_utc)?$|(?:Date|DateUTC|Datetime)$')
+# Xero's legacy JSON date format: /Date(1700000000000+0000)/
+_XERO_DATE_RE = r'/Date\((-?\d+)'
+
+def parse_date_columns(df):
+    """Converts date string columns to UTC datetimes with vectorized parsing.
+
+    Only object columns named like a date field and holding strings are
+    touched. A column is left as text if any of its values doesn't parse,
+    rather than losing those values to NaT.
+    """
+    for col in df.columns:
+        if df[col].dtype != 'object' or not _DATE_COLUMN_RE.search(str(col)):
+            continue
+        sample = next((v for v in df[col].values if v is not None and v == v), None)
+        if not isinstance(sample, str):
+            continue
+        if sample.startswith('/Date('):
+            millis = pd.to_numeric(df[col].str.extract(_XERO_DATE_RE, expand=False), errors='coerce')
+            parsed = pd.to_datetime(millis, unit='ms', utc=True)
+        else:
+            parsed = pd.to_datetime(df[col], format='ISO8601', utc=True, errors='coerce')
+        failed = int(parsed.isna().sum() - df[col].isna().sum())
+        if failed:
+            print(f"Leaving {col} as text: {failed} of {df[col].count()} values aren't dates")
+            continue
+        df[col] = parsed
+    return df
+
+def report_csv_export(future, record_count, csv_path):
+    """Reports the outcome of a background CSV export."""
+    error = future.exception()
+    if error is not None:
+        print(f"Failed to export CSV to {csv_path}: {error}")
+    else:
+        print(f"Successfully exported {record_count} records to {csv_path}")
+
+def optimize_dtypes(df):
+    """Shrinks a freshly built DataFrame before it is exported and upserted.
+
+    Integer columns are downcast to the smallest integer type that fits, and
+    repetitive string columns (statuses, currency codes, types) become
+    categories. Floats are left alone so amounts keep full precision.
+    """
+    for col in df.select_dtypes(include=['integer']).columns:
+        df[col] = pd.to_numeric(df[col], downcast='integer')
+
+    for col in df.select_dtypes(include=['object']).columns:
+        if pd.api.types.infer_dtype(df[col], skipna=True) != 'string':
+            continue
+        if df[col].nunique() / len(df) < 0.5:
+            df[col] = df[col].astype('category')
+    return df
+
 def main():
     """Main function to run the Xero to Supabase pipeline."""
     # Initialize Supabase
@@ -94,90 +280,143 @@ def main():
     # Refresh token if necessary
     client_id = os.getenv('CLIENT_ID')
     client_secret = os.getenv('CLIENT_SECRET')
-    
-    try:
-        token = refresh_xero_oauth2_token(client_id, client_secret, token)
-    except Exception as e:
-        print(f"Failed to refresh token: {e}")
-        print("Please run get_token.py again to get a new token.")
-        return
+
+    if is_token_expired(token):
+        try:
+            token = refresh_xero_oauth2_token(client_id, client_secret, token)
+            save_xero_oauth2_token(token)
+        except Exception as e:
+            print(f"Failed to refresh token: {e}")
+            print("Please run get_token.py again to get a new token.")
+            return
 
     # Initialize Xero API client
-    api_client = ApiClient(
-        Configuration(
-            debug=False,
-            oauth2_token=OAuth2Token(client_id=client_id, client_secret=client_secret)
-        ),
-        oauth2_token_getter=lambda: token,
-    )
-    accounting_api = AccountingApi(api_client)
-    payroll_api = PayrollAuApi(api_client) # Using AU payroll
+    api_client = build_api_client(client_id, client_secret, token)
 
-    try:
-        xero_tenant_id = get_xero_tenant_id(api_client)
-    except Exception as e:
-        print(e)
-        return
+    # The tenant ID is cached in the token file after the first lookup
+    xero_tenant_id = token.get('tenant_id')
+    # A cached tenant gets one fresh lookup if Xero rejects it
+    tenant = {'id': xero_tenant_id, 'looked_up': not xero_tenant_id}
+    tenant_lock = threading.Lock()
+    if not xero_tenant_id:
+        try:
+            tenant['id'] = get_xero_tenant_id(api_client)
+        except Exception as e:
+            print(e)
+            return
+        save_xero_tenant_id(token, tenant['id'])
+
+    def look_up_tenant_again():
+        """Drops the cached tenant ID, looks it up once and returns the current one."""
+        with tenant_lock:
+            if not tenant['looked_up']:
+                tenant['looked_up'] = True
+                print("Xero rejected the cached tenant ID, looking it up again...")
+                token.pop('tenant_id', None)
+                save_xero_oauth2_token(token)
+                tenant['id'] = get_xero_tenant_id(api_client)
+                save_xero_tenant_id(token, tenant['id'])
+            return tenant['id']
 
     # Define endpoints to fetch from Xero
+    # 'api' picks the API class and 'method' the call on it, so each worker
+    # thread can resolve them against its own client
     endpoints = {
-        'contacts': {'func': accounting_api.get_contacts, 'pk': 'contact_id', 'paginated': True},
-        'invoices': {'func': accounting_api.get_invoices, 'pk': 'invoice_id', 'paginated': True},
-        'accounts': {'func': accounting_api.get_accounts, 'pk': 'account_id', 'paginated': False},
-        'bank_transactions': {'func': accounting_api.get_bank_transactions, 'pk': 'bank_transaction_id', 'paginated': True},
-        'journals': {'func': accounting_api.get_journals, 'pk': 'journal_id', 'paginated': False},
-        'purchase_orders': {'func': accounting_api.get_purchase_orders, 'pk': 'purchase_order_id', 'paginated': True},
-        'manual_journals': {'func': accounting_api.get_manual_journals, 'pk': 'manual_journal_id', 'paginated': True},
-        'payments': {'func': accounting_api.get_payments, 'pk': 'payment_id', 'paginated': True},
-        'bank_transfers': {'func': accounting_api.get_bank_transfers, 'pk': 'bank_transfer_id', 'paginated': False},
-        'organisations': {'func': accounting_api.get_organisations, 'pk': 'organisation_id', 'paginated': False},
-        'items': {'func': accounting_api.get_items, 'pk': 'item_id', 'paginated': True},
-        'currencies': {'func': accounting_api.get_currencies, 'pk': 'code', 'paginated': False},
+        'contacts': {'api': 'accounting', 'method': 'get_contacts', 'pk': 'contact_id', 'paginated': True},
+        'invoices': {'api': 'accounting', 'method': 'get_invoices', 'pk': 'invoice_id', 'paginated': True},
+        'accounts': {'api': 'accounting', 'method': 'get_accounts', 'pk': 'account_id', 'paginated': False},
+        'bank_transactions': {'api': 'accounting', 'method': 'get_bank_transactions', 'pk': 'bank_transaction_id', 'paginated': True},
+        'journals': {'api': 'accounting', 'method': 'get_journals', 'pk': 'journal_id', 'paginated': False},
+        'purchase_orders': {'api': 'accounting', 'method': 'get_purchase_orders', 'pk': 'purchase_order_id', 'paginated': True},
+        'manual_journals': {'api': 'accounting', 'method': 'get_manual_journals', 'pk': 'manual_journal_id', 'paginated': True},
+        'payments': {'api': 'accounting', 'method': 'get_payments', 'pk': 'payment_id', 'paginated': True},
+        'bank_transfers': {'api': 'accounting', 'method': 'get_bank_transfers', 'pk': 'bank_transfer_id', 'paginated': False},
+        'organisations': {'api': 'accounting', 'method': 'get_organisations', 'pk': 'organisation_id', 'paginated': False},
+        'items': {'api': 'accounting', 'method': 'get_items', 'pk': 'item_id', 'paginated': True},
+        'currencies': {'api': 'accounting', 'method': 'get_currencies', 'pk': 'code', 'paginated': False},
         # Payroll endpoints (ensure you have the correct scopes and region)
-        'employees': {'func': payroll_api.get_employees, 'pk': 'employee_id', 'paginated': True},
-        'pay_runs': {'func': payroll_api.get_pay_runs, 'pk': 'pay_run_id', 'paginated': True},
-        'payslip': {'func': payroll_api.get_payslip, 'pk': 'payslip_id', 'paginated': False},
-        'timesheets': {'func': payroll_api.get_timesheets, 'pk': 'timesheet_id', 'paginated': True},
+        'employees': {'api': 'payroll', 'method': 'get_employees', 'pk': 'employee_id', 'paginated': True},
+        'pay_runs': {'api': 'payroll', 'method': 'get_pay_runs', 'pk': 'pay_run_id', 'paginated': True},
+        'payslip': {'api': 'payroll', 'method': 'get_payslip', 'pk': 'payslip_id', 'paginated': False},
+        'timesheets': {'api': 'payroll', 'method': 'get_timesheets', 'pk': 'timesheet_id', 'paginated': True},
     }
 
     # Create export directory if it doesn't exist
     export_dir = 'xero_exports'
     os.makedirs(export_dir, exist_ok=True)
 
-    for endpoint_name, details in endpoints.items():
+    def process_endpoint(endpoint_name, details):
+        """Fetch one endpoint, export it to CSV and upsert it into Supabase."""
         print(f"--- Fetching {endpoint_name} ---")
         try:
             # Special handling for payslip which requires a pay_run_id
             if endpoint_name == 'payslip':
                 print("Skipping payslip for now as it requires a specific PayRunID. You can modify the script to fetch these.")
-                continue
+                return
 
-            records = fetch_all_records(details['func'], xero_tenant_id, paginated=details['paginated'])
+            apis = get_thread_apis(client_id, client_secret, token)
+            api_call = getattr(apis[details['api']], details['method'])
+            tenant_id = tenant['id']
+            try:
+                records = fetch_all_records(api_call, tenant_id, paginated=details['paginated'])
+            except ApiException as e:
+                if not is_tenant_rejected(e):
+                    raise
+                retry_tenant_id = look_up_tenant_again()
+                if retry_tenant_id == tenant_id:
+                    raise
+                records = fetch_all_records(api_call, retry_tenant_id, paginated=details['paginated'])
             
             if not records:
                 print(f"No records found for {endpoint_name}.")
-                continue
+                return
+
+            # Built as a plain object-backed frame on purpose: expand_json_columns
+            # and the Supabase prep look for dicts in object columns, which an
+            # Arrow-backed frame (pa.Table.from_pylist(...).to_pandas(types_mapper=pd.ArrowDtype))
+            # would hide inside struct columns. The Xero records also mix Decimal,
+            # datetime and ragged nested dicts, which Arrow type inference rejects.
+            df = optimize_dtypes(parse_date_columns(pd.DataFrame(records)))
+            record_count = len(records)
+            # The frame holds everything from here on
+            del records
 
-            df = pd.DataFrame(records)
-            
             # --- CSV Export Fallback ---
+            # Written in the background while the Supabase upsert runs
             csv_path = os.path.join(export_dir, f"{endpoint_name}.csv")
-            df.to_csv(csv_path, index=False)
-            print(f"Successfully exported {len(records)} records to {csv_path}")
+            csv_future = csv_executor.submit(export_csv, df, csv_path)
+            csv_future.add_done_callback(
+                lambda future: report_csv_export(future, record_count, csv_path)
+            )
 
             # --- Supabase Upsert ---
             # Expand JSON columns before creating table or upserting
             df_expanded = supabase_config.expand_json_columns(df)
-            
+            # Only the CSV export still needs the unexpanded frame
+            del df
+
             # Create table if it doesn't exist
-            supabase_config.create_table_if_not_exist(
-                table_name=endpoint_name, 
-                df=df_expanded, 
-                primary_key=details['pk']
-            )
+            with _table_lock:
+                supabase_config.create_table_if_not_exist(
+                    table_name=endpoint_name, 
+                    df=df_expanded, 
+                    primary_key=details['pk']
+                )
             
             # Prepare and upsert data
-            records_to_upsert = supabase_config.prepare_data_for_supabase(df_expanded.to_dict('records'))
+            # NaN -> None for the whole frame at once, then only the dict/list columns need serializing
+            # Timestamps go out as ISO-8601 strings, which both the REST API and COPY accept
+            for col in df_expanded.select_dtypes(include=['datetime', 'datetimetz']).columns:
+                df_expanded[col] = df_expanded[col].map(lambda ts: ts.isoformat(), na_action='ignore')
+            df_expanded = df_expanded.astype(object).where(df_expanded.notna(), None)
+            json_cols = [
+                col for col in df_expanded.columns
+                if df_expanded[col].map(lambda v: isinstance(v, (dict, list))).any()
+            ]
+            records_to_upsert = supabase_config.prepare_data_for_supabase(
+                df_expanded.to_dict('records'), json_columns=json_cols
+            )
+            del df_expanded
             supabase_config.upsert_data(
                 table_name=endpoint_name, 
                 records=records_to_upsert,
@@ -187,7 +426,15 @@ def main():
         except Exception as e:
             print(f"Failed to process {endpoint_name}: {e}")
             # Log the error and continue to the next endpoint
-            continue
+
+    with ThreadPoolExecutor(max_workers=CSV_WORKERS) as csv_executor, \
+            ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+        futures = {
+            executor.submit(process_endpoint, endpoint_name, details): endpoint_name
+            for endpoint_name, details in endpoints.items()
+        }
+        for future in as_completed(futures):
+            future.result()
 
 if __name__ == "__main__":
     main()
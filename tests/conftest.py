@@ -0,0 +1,40 @@
+import os
+import sys
+import types
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# The exporters are top-level scripts rather than an installed package, and
+# the modules in xero_api import each other as top-level modules
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, 'xero_api'))
+
+
+@pytest.fixture(scope='session')
+def new_int():
+    """new_int.py as a module, without the Power BI block that calls Xero on import."""
+    pytest.importorskip('pandas')
+    pytest.importorskip('xero_python')
+    os.environ.setdefault('TENANT_ID', 'test-tenant')
+
+    path = os.path.join(ROOT, 'new_int.py')
+    with open(path) as f:
+        source = f.read().split('# POWER BI EXECUTION', 1)[0]
+    module = types.ModuleType('new_int')
+    module.__file__ = path
+    exec(compile(source, path, 'exec'), module.__dict__)
+    return module
+
+
+@pytest.fixture
+def object_strings():
+    """Build string columns as object dtype, as the pandas 2 the exporters target does."""
+    pd = pytest.importorskip('pandas')
+    try:
+        with pd.option_context('future.infer_string', False):
+            yield
+    except pd.errors.OptionError:
+        # pandas without the option already uses object columns
+        yield
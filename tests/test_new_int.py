@@ -0,0 +1,140 @@
+import datetime
+
+import pytest
+
+# Trimmed from real GET /CreditNotes and GET /BankTransactions responses
+CREDIT_NOTES = [
+    {'CreditNoteID': 'aea95d78-ea48-456b-9b08-6bc012600072', 'Type': 'ACCRECCREDIT', 'Total': 50.0},
+]
+BANK_CREDITS = [
+    {'BankTransactionID': 'd20b6c54-7f5d-4ce6-ab83-55f609719126', 'Type': 'RECEIVE-OVERPAYMENT', 'Total': 20.0},
+    {'BankTransactionID': 'a2c8dc3c-5f2e-4f7b-9d1e-6e0c2f1b8a11', 'Type': 'SPEND-REFUND', 'Total': 5.0},
+]
+
+
+def test_bank_credits_come_through_the_split(new_int, monkeypatch):
+    calls = {}
+
+    def fake_paginated_call(url, description="API Call", key_name=None, params=None, **kwargs):
+        calls[key_name] = params
+        return {'CreditNotes': CREDIT_NOTES, 'BankTransactions': BANK_CREDITS}[key_name]
+
+    monkeypatch.setattr(new_int, 'make_paginated_api_call', fake_paginated_call)
+
+    credit_notes, bank_credits = new_int._split_credit_transactions(new_int.get_credit_transactions())
+
+    assert list(credit_notes['CreditNoteID']) == [CREDIT_NOTES[0]['CreditNoteID']]
+    assert list(bank_credits['BankTransactionID']) == [t['BankTransactionID'] for t in BANK_CREDITS]
+    assert 'CreditNoteID' not in bank_credits.columns
+    # One comparison per type; a single comma-joined string matches nothing
+    assert calls['BankTransactions']['where'] == (
+        'Type=="SPEND-OVERPAYMENT" OR Type=="SPEND-PREPAYMENT" OR Type=="SPEND-REFUND" OR '
+        'Type=="RECEIVE-OVERPAYMENT" OR Type=="RECEIVE-PREPAYMENT" OR Type=="RECEIVE-REFUND"'
+    )
+
+
+def test_failed_page_is_not_reported_as_a_complete_fetch(new_int, monkeypatch):
+    def fake_fetch_page(url, params, page):
+        if page == 2:
+            raise new_int.requests.exceptions.ConnectionError('connection reset')
+        return {'Contacts': [{'ContactID': f'contact-{page}'}] * 100}
+
+    monkeypatch.setattr(new_int, '_fetch_page', fake_fetch_page)
+
+    with pytest.raises(new_int.requests.exceptions.ConnectionError):
+        new_int._fetch_all_pages('https://example.test/Contacts', {}, 3, 'Contacts', 'Contacts')
+    with pytest.raises(new_int.requests.exceptions.ConnectionError):
+        new_int.make_paginated_api_call('https://example.test/Contacts', 'Contacts', key_name='Contacts')
+
+
+def test_normalized_dates_stay_strings(new_int, object_strings):
+    frames = new_int.normalize_data({'Payments': [
+        {'PaymentID': 'b26fd49a-cbae-470a-a8f8-bcbc119e0379', 'Date': '2025-01-31T00:00:00', 'Reference': 'INV-0001'},
+        {'PaymentID': '0a0ef7ee-7b91-46fa-8136-c4cc6aa3e9a1', 'Date': '2025-02-03T00:00:00', 'Reference': 'INV-0002'},
+    ]}, 'Payments')
+
+    assert list(frames['Payments']['Date']) == ['2025-01-31', '2025-02-03']
+
+
+def test_statement_cache_hands_out_copies_and_tracks_today(new_int, monkeypatch):
+    fetched = []
+
+    class FakeDate:
+        today_value = datetime.date(2025, 3, 31)
+
+        @classmethod
+        def today(cls):
+            return cls.today_value
+
+    def fake_get(url, params=None, **kwargs):
+        fetched.append(dict(params))
+        response = new_int.requests.Response()
+        response.status_code = 200
+        response._content = b'{"reports": [{"reportTitle": "Profit and Loss"}]}'
+        return response
+
+    monkeypatch.setattr(new_int, '_get', fake_get)
+    monkeypatch.setattr(new_int, 'get_headers', lambda: {})
+    monkeypatch.setattr(new_int, 'date', FakeDate)
+    new_int.get_profit_and_loss.cache_clear()
+
+    first = new_int.get_profit_and_loss('2025-01-01', '2025-03-31')
+    first['reports'].clear()
+    assert new_int.get_profit_and_loss(start_date='2025-01-01', end_date='2025-03-31')['reports']
+    assert len(fetched) == 1
+
+    # Xero's default end date is today, so a defaulted call is fetched again the next day
+    new_int.get_profit_and_loss()
+    new_int.get_profit_and_loss()
+    FakeDate.today_value = datetime.date(2025, 4, 1)
+    new_int.get_profit_and_loss()
+    assert fetched[1:] == [{}, {}]
+
+
+def test_invoice_amounts_stay_float64(new_int, monkeypatch, object_strings):
+    invoices = [
+        {'InvoiceID': f'invoice-{i}', 'Total': f'{(i * 7919) % 100000 / 100:.2f}', 'AmountDue': '0.10'}
+        for i in range(2000)
+    ]
+    monkeypatch.setattr(new_int, 'make_paginated_api_call', lambda *args, **kwargs: invoices)
+
+    df = new_int.get_invoices()
+
+    assert df['Total'].dtype == 'float64'
+    assert df['AmountDue'].dtype == 'float64'
+    assert df['Total'].sum() == pytest.approx(sum(float(i['Total']) for i in invoices), abs=1e-6)
+
+
+@pytest.mark.filterwarnings('error')
+@pytest.mark.parametrize('infer_string', [False, True])
+def test_string_columns_become_arrow_strings(new_int, infer_string):
+    pd = pytest.importorskip('pandas')
+    pa = pytest.importorskip('pyarrow')
+    with pd.option_context('future.infer_string', infer_string):
+        df = pd.DataFrame({
+            'Name': ['City Agency', None],
+            'Total': [50.0, 20.0],
+            'LineItems': [[{'Quantity': 1}], []],
+        })
+
+    df = new_int._use_arrow_strings(df)
+
+    assert df['Name'].dtype == pd.ArrowDtype(pa.string())
+    assert df['Total'].dtype == 'float64'
+    assert df['LineItems'].dtype == object
+
+
+def test_xero_dates_of_any_length_are_parsed(new_int, monkeypatch, object_strings):
+    pd = pytest.importorskip('pandas')
+    invoices = [
+        {'InvoiceID': 'invoice-1', 'Date': '/Date(1735689600000+0000)/', 'FullyPaidOnDate': '/Date(978307200000+0000)/'},
+        {'InvoiceID': 'invoice-2', 'Date': '/Date(1735776000000)/', 'FullyPaidOnDate': '/Date(-86400000+0000)/'},
+        {'InvoiceID': 'invoice-3', 'Date': '/Date(1735862400000+1300)/', 'FullyPaidOnDate': None},
+    ]
+    monkeypatch.setattr(new_int, 'make_paginated_api_call', lambda *args, **kwargs: invoices)
+
+    df = new_int.get_invoices()
+
+    assert list(df['Date']) == list(pd.to_datetime(['2025-01-01', '2025-01-02', '2025-01-03']))
+    assert list(df['FullyPaidOnDate'][:2]) == list(pd.to_datetime(['2001-01-01', '1969-12-31']))
+    assert pd.isna(df['FullyPaidOnDate'][2])
@@ -0,0 +1,51 @@
+import pytest
+
+pd = pytest.importorskip('pandas')
+pytest.importorskip('xero_python')
+pytest.importorskip('supabase')
+
+from xero_python.exceptions import ApiException
+
+from pipeline import fetch_all_records, parse_date_columns
+
+
+# Built as object columns, as pd.DataFrame(records) does for the SDK's records
+def test_only_date_fields_are_parsed():
+    df = pd.DataFrame({
+        'updated_date_utc': ['2025-01-02T09:15:00', None],
+        'due_date': ['/Date(1738281600000+0000)/', '/Date(1738368000000+0000)/'],
+        # Named like dates only by substring
+        'update_status': ['2025-01-02', '2025-01-03'],
+        'has_dates_list': ['2025-01-02', '2025-01-03'],
+    }, dtype=object)
+
+    parse_date_columns(df)
+
+    assert isinstance(df['updated_date_utc'].dtype, pd.DatetimeTZDtype)
+    assert df['due_date'].iloc[0] == pd.Timestamp('2025-01-31', tz='UTC')
+    assert df['update_status'].dtype == object
+    assert df['has_dates_list'].dtype == object
+
+
+def test_column_with_unparseable_values_is_kept():
+    df = pd.DataFrame({'date': ['2025-01-02', 'not recorded', '2025-01-04']}, dtype=object)
+
+    parse_date_columns(df)
+
+    assert list(df['date']) == ['2025-01-02', 'not recorded', '2025-01-04']
+
+
+class RejectingApi:
+    def __init__(self, status):
+        self.status = status
+
+    def get_contacts(self, xero_tenant_id, **kwargs):
+        raise ApiException(status=self.status, reason='Unauthorized')
+
+
+@pytest.mark.parametrize('paginated', [True, False])
+def test_rejected_tenant_reaches_the_caller(paginated):
+    # main() looks a cached tenant up again on 401/403, so these must not be swallowed
+    with pytest.raises(ApiException):
+        fetch_all_records(RejectingApi(403).get_contacts, 'stale-tenant', paginated=paginated)
+    assert fetch_all_records(RejectingApi(500).get_contacts, 'tenant', paginated=paginated) == []
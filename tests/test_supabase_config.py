@@ -0,0 +1,39 @@
+import json
+
+import pytest
+
+pd = pytest.importorskip('pandas')
+pytest.importorskip('supabase')
+
+from supabase_config import supabase_config
+
+
+def test_expand_json_columns_schema():
+    # Shaped like pd.DataFrame(records) for two SDK invoices
+    df = pd.DataFrame({
+        'invoice_id': ['inv-1', 'inv-2'],
+        'contact': [{'contact_id': 'c-1', 'name': 'City Agency', 'balances': {'outstanding': 115.0}}, None],
+        'line_items': [[{'description': 'Consulting', 'quantity': 1.0}], []],
+        'payments': ['[{"amount": 115.0}]', '[]'],
+        'branding_theme': ['{"name": "Standard"}', '{"name": "Special"}'],
+    }, dtype=object)
+
+    expanded = supabase_config.expand_json_columns(df)
+
+    # One row per invoice, so invoice_id stays a usable primary key
+    assert list(expanded['invoice_id']) == ['inv-1', 'inv-2']
+    assert list(expanded.columns) == [
+        'invoice_id', 'line_items', 'payments',
+        'contact.contact_id', 'contact.name', 'contact.balances.outstanding', 'branding_theme.name',
+    ]
+    assert expanded['contact.name'][0] == 'City Agency' and pd.isna(expanded['contact.name'][1])
+    assert list(expanded['branding_theme.name']) == ['Standard', 'Special']
+    # Lists stay whole and are written as JSON text
+    assert list(expanded['line_items']) == [[{'description': 'Consulting', 'quantity': 1.0}], []]
+    assert list(expanded['payments']) == [[{'amount': 115.0}], []]
+    [record] = supabase_config.prepare_data_for_supabase(
+        [{'line_items': expanded['line_items'][0]}], json_columns=['line_items']
+    )
+    assert json.loads(record['line_items']) == [{'description': 'Consulting', 'quantity': 1.0}]
+    # The caller's frame (still being exported to CSV) is left alone
+    assert list(df.columns) == ['invoice_id', 'contact', 'line_items', 'payments', 'branding_theme']
@@ -0,0 +1,43 @@
+import json
+
+import pytest
+
+pytest.importorskip('xero_python')
+pytest.importorskip('requests_oauthlib')
+
+import xero_client
+from xero_client import XeroClient
+
+TOKEN = {
+    'access_token': 'old-access',
+    'refresh_token': 'old-refresh',
+    'token_type': 'Bearer',
+    'expires_at': 1760000000,
+    'tenant_id': '70784a63-d24b-46a9-a4db-0e70a274b056',
+}
+
+
+@pytest.fixture
+def token_file(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setitem(xero_client._TOKEN_CACHE, 'data', None)
+    monkeypatch.setitem(xero_client._TOKEN_CACHE, 'mtime', 0)
+    path = tmp_path / xero_client.TOKEN_FILE
+    path.write_text(json.dumps(TOKEN))
+    return path
+
+
+def test_refreshed_token_keeps_the_cached_tenant(token_file, monkeypatch):
+    client = XeroClient.__new__(XeroClient)
+    client.token = client._load_token()
+    client.tenant_id = client.token['tenant_id']
+
+    # What OAuth2Session hands the token_updater after a refresh
+    client._save_token({'access_token': 'new-access', 'refresh_token': 'new-refresh',
+                        'token_type': 'Bearer', 'expires_at': 1760001800})
+
+    saved = json.loads(token_file.read_text())
+    assert saved['access_token'] == 'new-access'
+    assert saved['tenant_id'] == TOKEN['tenant_id']
+    assert client.token == saved
+    assert client._load_token() == saved
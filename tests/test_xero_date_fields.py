@@ -0,0 +1,65 @@
+from xero_date_fields import XERO_DATE_FIELDS, date_columns
+
+
+def _flatten(record, prefix=''):
+    """Flatten nested dicts the way pd.json_normalize(sep='.') names columns."""
+    columns = []
+    for key, value in record.items():
+        name = f"{prefix}{key}"
+        if isinstance(value, dict):
+            columns.extend(_flatten(value, f"{name}."))
+        else:
+            columns.append(name)
+    return columns
+
+
+# Trimmed from a real GET /Invoices response
+INVOICE = {
+    'Type': 'ACCREC',
+    'InvoiceID': '243216c5-369e-4056-ac67-05388f86dc81',
+    'InvoiceNumber': 'INV-0001',
+    'Reference': 'Updated 2025-01-01 by import',
+    'Contact': {
+        'ContactID': '025867f1-d741-4d6b-b1af-9ac774b59ba7',
+        'Name': 'City Agency',
+        'UpdatedDateUTC': '2025-01-02T09:15:00',
+    },
+    'Date': '/Date(1735689600000+0000)/',
+    'DateString': '2025-01-01T00:00:00',
+    'DueDate': '/Date(1738281600000+0000)/',
+    'DueDateString': '2025-01-31T00:00:00',
+    'ExpectedPaymentDate': '/Date(1738281600000+0000)/',
+    'PlannedPaymentDate': '/Date(1738281600000+0000)/',
+    'FullyPaidOnDate': '/Date(1738368000000+0000)/',
+    'Status': 'PAID',
+    'LineAmountTypes': 'Exclusive',
+    'SubTotal': 100.0,
+    'TotalTax': 15.0,
+    'Total': 115.0,
+    'AmountDue': 0.0,
+    'AmountPaid': 115.0,
+    'CurrencyCode': 'NZD',
+    'UpdatedDateUTC': '/Date(1738368000000+0000)/',
+}
+
+
+def test_invoice_date_columns():
+    assert date_columns(_flatten(INVOICE)) == [
+        'Contact.UpdatedDateUTC',
+        'Date',
+        'DateString',
+        'DueDate',
+        'DueDateString',
+        'ExpectedPaymentDate',
+        'PlannedPaymentDate',
+        'FullyPaidOnDate',
+        'UpdatedDateUTC',
+    ]
+
+
+def test_files_api_spelling():
+    assert date_columns(['Name', 'CreatedDateUtc', 'UpdatedDateUtc']) == ['CreatedDateUtc', 'UpdatedDateUtc']
+
+
+def test_free_text_columns_are_not_dates():
+    assert not {'Reference', 'Status', 'InvoiceNumber', 'CurrencyCode'} & XERO_DATE_FIELDS
@@ -0,0 +1,91 @@
+import json
+
+import pytest
+
+pd = pytest.importorskip('pandas')
+pytest.importorskip('dotenv')
+
+import xero_export
+
+# Trimmed from a real GET /Reports/BankSummary response
+BANK_SUMMARY = {
+    'Reports': [{'ReportName': 'Bank Summary'}],
+    'Rows': [
+        {'RowType': 'Header', 'Cells': [{'Value': 'Bank Accounts'}, {'Value': 'Closing Balance'}]},
+        {'RowType': 'Section', 'Rows': [
+            {'RowType': 'Row', 'Cells': [{'Value': 'Business Bank Account'}, {'Value': '12453.12'}]},
+        ]},
+    ],
+}
+EMPTY_REPORT = {'Reports': [{'ReportName': 'Bank Summary'}], 'Rows': []}
+
+
+class FakeResponse:
+    def __init__(self, body, etag):
+        self.status_code = 200
+        self.content = json.dumps(body).encode('utf-8')
+        self.headers = {'ETag': etag}
+
+    def raise_for_status(self):
+        pass
+
+
+@pytest.fixture
+def export_dir(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(xero_export, '_ETAGS', None)
+    monkeypatch.setattr(xero_export, 'get_headers', lambda: {})
+    monkeypatch.setattr(xero_export, '_REPORTS', (('BankSummary', 'bank_summary'),))
+    return tmp_path
+
+
+def _serve(monkeypatch, body, etag='"v2"'):
+    sent = []
+
+    def fake_get(url, headers=None, params=None):
+        sent.append(headers.get('If-None-Match'))
+        return FakeResponse(body, etag)
+
+    monkeypatch.setattr(xero_export._SESSION, 'get', fake_get)
+    return sent
+
+
+def _saved_etags(export_dir):
+    path = export_dir / xero_export.ETAG_FILE
+    return json.loads(path.read_text()) if path.exists() else {}
+
+
+def test_etag_is_saved_only_after_the_report_is_written(export_dir, monkeypatch):
+    _serve(monkeypatch, BANK_SUMMARY)
+    data, etag = xero_export.get_report('BankSummary', use_etag=True)
+    assert etag == '"v2"'
+    assert _saved_etags(export_dir) == {}
+
+    assert xero_export.export_all_reports() == [xero_export.os.path.join('xero_exports', 'bank_summary.csv')]
+    assert (export_dir / 'xero_exports' / 'bank_summary.csv').exists()
+    assert _saved_etags(export_dir) == {'Reports/BankSummary?': '"v2"'}
+
+
+@pytest.mark.parametrize('failure', ['empty report', 'write error'])
+def test_failed_export_forgets_the_etag(export_dir, monkeypatch, failure):
+    stale = export_dir / 'xero_exports' / 'bank_summary.csv'
+    stale.parent.mkdir()
+    stale.write_text('stale\n')
+    (export_dir / xero_export.ETAG_FILE).write_text(json.dumps({'Reports/BankSummary?': '"v1"'}))
+
+    if failure == 'empty report':
+        sent = _serve(monkeypatch, EMPTY_REPORT)
+    else:
+        sent = _serve(monkeypatch, BANK_SUMMARY)
+
+        def broken_to_csv(self, f, **kwargs):
+            f.write('half a row')
+            raise OSError('disk full')
+
+        monkeypatch.setattr(pd.DataFrame, 'to_csv', broken_to_csv)
+
+    assert xero_export.export_all_reports() == []
+    assert sent == ['"v1"']
+    # The next run asks for the full report instead of a 304 for the stale CSV
+    assert _saved_etags(export_dir) == {}
+    assert stale.read_text() == 'stale\n'
@@ -0,0 +1,79 @@
+import pytest
+
+pd = pytest.importorskip('pandas')
+pa = pytest.importorskip('pyarrow')
+
+from xero_api.xero_export_clean import REPORT_COLUMNS, flatten_daily_pnl
+
+# Trimmed from a real GET /Reports/ProfitAndLoss response for a single day
+REPORT = {
+    'ReportID': 'ProfitAndLoss',
+    'Rows': [
+        {'RowType': 'Header', 'Cells': [{'Value': ''}, {'Value': '1 Jan 2025'}]},
+        {
+            'RowType': 'Section',
+            'Title': 'Income',
+            'Rows': [
+                {
+                    'RowType': 'Row',
+                    'Cells': [
+                        {'Value': 'Sales', 'Attributes': [{'Value': '5040915e-8ce7-4177-8d08-fde416232f18', 'Id': 'account'}]},
+                        {'Value': '1250.00'},
+                    ],
+                },
+                {'RowType': 'SummaryRow', 'Cells': [{'Value': 'Total Income'}, {'Value': '1250.00'}]},
+            ],
+        },
+    ],
+}
+
+
+def test_narrow_day_converts_to_the_string_schema():
+    # The file is sized for wider reports than this one
+    fieldnames = pd.Index(['ReportDate'] + REPORT_COLUMNS + ['Column_1', 'Column_2', 'Column_3'])
+    schema = pa.schema([(name, pa.string()) for name in fieldnames])
+
+    day_df = flatten_daily_pnl(REPORT, '2025-01-01', fieldnames)
+    table = pa.Table.from_pandas(day_df, schema=schema, preserve_index=False)
+
+    # Older pyarrow releases refuse float64 columns for a string field, even all-NaN ones
+    assert (day_df.dtypes == object).all()
+
+    assert table.to_pydict() == {
+        'ReportDate': ['2025-01-01', '2025-01-01'],
+        'Section': ['Income', 'Income'],
+        'RowType': ['Row', 'SummaryRow'],
+        'Account': ['Sales', 'Total Income'],
+        'AccountID': ['5040915e-8ce7-4177-8d08-fde416232f18', None],
+        'Column_1': ['1250.00', '1250.00'],
+        'Column_2': [None, None],
+        'Column_3': [None, None],
+    }
+
+
+def test_daily_pnl_is_written_in_date_order_and_counts_failures(tmp_path, monkeypatch, capsys):
+    from xero_api import xero_export_clean
+
+    # Three-cell rows don't fit the single value column
+    wide = {'Rows': [{'RowType': 'Section', 'Title': 'Income', 'Rows': [
+        {'RowType': 'Row', 'Cells': [{'Value': 'Sales'}, {'Value': '1.00'}, {'Value': '2.00'}]},
+    ]}]}
+
+    def fake_fetch_daily_pnl(date_str):
+        if date_str == '2025-01-02':
+            raise ValueError("Empty or invalid response from API")
+        return {'Reports': [wide if date_str == '2025-01-03' else REPORT]}
+
+    monkeypatch.setattr(xero_export_clean, 'EXPORT_FOLDER', str(tmp_path))
+    monkeypatch.setattr(xero_export_clean, 'authenticate', lambda: None)
+    monkeypatch.setattr(xero_export_clean, 'fetch_all_pages', lambda endpoint: [])
+    monkeypatch.setattr(xero_export_clean, 'stream_api_call', lambda endpoint: iter([]))
+    monkeypatch.setattr(xero_export_clean, 'export_report', lambda report: None)
+    monkeypatch.setattr(xero_export_clean, 'fetch_daily_pnl', fake_fetch_daily_pnl)
+
+    xero_export_clean.export_all()
+
+    days = pd.read_parquet(tmp_path / 'profit_loss_daily_breakdown.parquet')['ReportDate']
+    assert days.is_monotonic_increasing
+    assert list(days.unique()[:2]) == ['2025-01-01', '2025-01-04']
+    assert '- Failed days: 2\n' in capsys.readouterr().out
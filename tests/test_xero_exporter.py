@@ -0,0 +1,65 @@
+from datetime import datetime
+from decimal import Decimal
+
+import pytest
+
+pytest.importorskip('pandas')
+pytest.importorskip('xero_python')
+
+from xero_exporter import _SCHEMA_CACHE, XeroExporter
+
+
+class Model:
+    """Stands in for an SDK model; only to_dict() is used."""
+
+    def __init__(self, record):
+        self.record = record
+
+    def to_dict(self):
+        return self.record
+
+
+def _contact(**overrides):
+    # Trimmed from Contact.to_dict() output
+    record = {
+        'contact_id': '025867f1-d741-4d6b-b1af-9ac774b59ba7',
+        'name': 'City Agency',
+        'balances': {'accounts_receivable': {'outstanding': Decimal('115.00'), 'overdue': None}},
+        'payment_terms': {},
+        'addresses': {'city': 'Wellington', 'geo': {'lat': -41.29, 'lng': 174.78}, 'postal_code': '6011'},
+        'discount': 5,
+        'updated_date_utc': datetime(2025, 1, 2, 9, 15),
+    }
+    record.update(overrides)
+    return record
+
+
+# Samples the cached schema handles itself; the rest fall back to json_normalize
+FLAT = {
+    'uniform': [_contact(), _contact(name='Bayside Club', updated_date_utc=datetime(2025, 1, 3))],
+    'missing fields': [_contact(), _contact(balances={}, discount=None)],
+    'midnight dates': [_contact(updated_date_utc=datetime(2025, 1, 2)), _contact(updated_date_utc=datetime(2025, 1, 3))],
+    'missing key': [_contact(), {k: v for k, v in _contact().items() if k != 'discount'}],
+}
+SAMPLES = {
+    **FLAT,
+    'none for object': [_contact(), _contact(balances=None)],
+    'object for scalar': [_contact(), _contact(discount={'rate': 5})],
+    'empty object filled': [_contact(), _contact(payment_terms={'bills': {'day': 20}})],
+    'new nested key': [_contact(), _contact(balances={'accounts_payable': {'outstanding': 1}})],
+}
+
+
+@pytest.mark.parametrize('records', SAMPLES.values(), ids=SAMPLES.keys())
+def test_export_records_matches_to_dataframe(tmp_path, records):
+    exporter = XeroExporter.__new__(XeroExporter)
+    exporter.export_dir = str(tmp_path)
+    models = [Model(record) for record in records]
+    _SCHEMA_CACHE.pop('contacts', None)
+
+    expected = exporter._save_to_csv(exporter._to_dataframe(models), 'expected')
+    actual = exporter._export_records(models, 'contacts')
+
+    assert ('contacts' in _SCHEMA_CACHE) == (records in FLAT.values())
+    with open(expected, encoding='utf-8') as f_expected, open(actual, encoding='utf-8') as f_actual:
+        assert f_actual.read() == f_expected.read()
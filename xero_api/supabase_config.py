@@ -1,28 +1,123 @@
 
 import os
+import io
+import csv
 import pandas as pd
+import atexit
+import threading
+from contextlib import contextmanager
 import psycopg2
+import psycopg2.pool
+from psycopg2 import sql
 from supabase import create_client, Client
+from postgrest.exceptions import APIError
 from dotenv import load_dotenv
-import numpy as np
 import json
+import gzip
+import time
+import httpx
+from concurrent.futures import ThreadPoolExecutor
 from decimal import Decimal
 
-# Custom JSON encoder to handle Decimal types
-class CustomJSONEncoder(json.JSONEncoder):
-    def default(self, obj):
-        if isinstance(obj, Decimal):
-            return float(obj)
-        return super(CustomJSONEncoder, self).default(obj)
+# orjson parses and serializes JSON far faster than the stdlib; fall back if it isn't installed
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+def _json_default(obj):
+    """Handle the types the JSON encoders don't know about (Decimal from the Xero SDK)."""
+    if isinstance(obj, Decimal):
+        return float(obj)
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+def _json_dumps(value) -> str:
+    if orjson is not None:
+        return orjson.dumps(value, default=_json_default).decode('utf-8')
+    return json.dumps(value, default=_json_default)
+
+def _json_loads(value):
+    if orjson is not None:
+        return orjson.loads(value)
+    return json.loads(value)
+
+def _first_non_null(values):
+    """Returns the first value that isn't None or NaN, without scanning the rest of the column."""
+    return next((v for v in values if v is not None and v == v), None)
+
+# Request bodies smaller than this aren't worth compressing
+GZIP_MIN_BODY_SIZE = 1024
+
+def _gzip_request_body(request: httpx.Request):
+    """httpx request hook that gzips large upsert bodies before they are sent."""
+    if request.method not in ('POST', 'PATCH') or 'Content-Encoding' in request.headers:
+        return
+    body = request.read()
+    if len(body) < GZIP_MIN_BODY_SIZE:
+        return
+    compressed = gzip.compress(body, compresslevel=5)
+    request.stream = httpx.ByteStream(compressed)
+    request._content = compressed
+    request.headers['Content-Encoding'] = 'gzip'
+    request.headers['Content-Length'] = str(len(compressed))
 
 # Load environment variables from .env file
 load_dotenv()
 
+# Upserts are sent as batches of this many records, several at a time
+UPSERT_BATCH_SIZE = 1000
+UPSERT_WORKERS = 4
+
+# Retries for a batch rejected with 429/503, doubling the wait each time
+UPSERT_MAX_RETRIES = 5
+UPSERT_BACKOFF_SECONDS = 1
+_RETRYABLE_STATUSES = frozenset({429, 503})
+
+def _is_retryable(error: Exception) -> bool:
+    """True if error carries an HTTP 429/503 status from PostgREST or httpx."""
+    if isinstance(error, httpx.HTTPStatusError):
+        status = error.response.status_code
+    elif isinstance(error, APIError):
+        # postgrest puts the HTTP status in `code` when the body isn't a PostgREST error
+        status = error.code
+    else:
+        return False
+    try:
+        return int(status) in _RETRYABLE_STATUSES
+    except (TypeError, ValueError):
+        return False
+
+# Above this many records, upserts go through COPY on the direct DB connection instead of PostgREST
+COPY_UPSERT_THRESHOLD = 500
+
+# Upper bound on pooled direct DB connections (one per concurrent COPY upsert, plus DDL)
+DB_POOL_MAX_CONNECTIONS = 8
+
+# Marker written for None in the COPY CSV, so NULLs stay distinct from empty strings
+_COPY_NULL = r'\N'
+
+# NumPy dtype kind -> PostgreSQL column type
+_KIND_TO_SQL = {
+    'i': 'BIGINT',
+    'u': 'BIGINT',
+    'f': 'FLOAT8',
+    'b': 'BOOLEAN',
+    'M': 'TIMESTAMPTZ',
+}
+
 class SupabaseConfig:
     def __init__(self):
         self.url = os.getenv("SUPABASE_URL")
         self.key = os.getenv("SUPABASE_KEY")
         self.client: Client = None
+        # Opt-in, since not every Supabase/PostgREST deployment accepts gzip request bodies
+        self.gzip_upserts = os.getenv("SUPABASE_GZIP_UPSERTS", "").lower() in ("1", "true", "yes")
+
+        # Set once the 'exec' helper has been created, so re-initializing skips the DDL
+        self._exec_function_ready = False
+        # Tables already confirmed or created, so repeated runs skip information_schema
+        self._known_tables: set[str] = set()
+        self._known_tables_loaded = False
 
         # Database connection details for direct connection
         self.db_host = os.getenv("DB_HOST")
@@ -31,13 +126,24 @@ class SupabaseConfig:
         self.db_user = os.getenv("DB_USER")
         self.db_password = os.getenv("DB_PASSWORD")
 
+        # Direct DB connections are pooled and opened on first use
+        self._pool = None
+        self._pool_lock = threading.Lock()
+
+    def _create_client(self) -> Client:
+        """Creates the Supabase client, gzip-compressing REST request bodies when enabled."""
+        client = create_client(self.url, self.key)
+        if self.gzip_upserts:
+            client.postgrest.session.event_hooks['request'].append(_gzip_request_body)
+        return client
+
     def initialize(self) -> bool:
         """Initializes the Supabase client and ensures helper functions exist."""
         if not self.url or not self.key:
             print("Error: SUPABASE_URL and SUPABASE_KEY must be set in .env file.")
             return False
         try:
-            self.client = create_client(self.url, self.key)
+            self.client = self._create_client()
             print("Supabase client initialized successfully.")
             # Ensure the required 'exec' function exists for running raw SQL
             self._create_exec_function_if_not_exist()
@@ -46,15 +152,39 @@ class SupabaseConfig:
             print(f"Failed to initialize Supabase client: {e}")
             return False
 
+    def _has_db_credentials(self) -> bool:
+        return all([self.db_host, self.db_port, self.db_name, self.db_user, self.db_password])
+
+    def _conn_string(self) -> str:
+        """Builds the psycopg2 connection string for the direct database connection."""
+        return f"dbname='{self.db_name}' user='{self.db_user}' host='{self.db_host}' port='{self.db_port}' password='{self.db_password}' options='-c search_path=public'"
+
+    @contextmanager
+    def _connection(self):
+        """Lends a pooled DB connection, committing on success and rolling back on error."""
+        if self._pool is None:
+            with self._pool_lock:
+                if self._pool is None:
+                    self._pool = psycopg2.pool.ThreadedConnectionPool(1, DB_POOL_MAX_CONNECTIONS, self._conn_string())
+                    atexit.register(self._pool.closeall)
+
+        conn = self._pool.getconn()
+        try:
+            with conn:
+                yield conn
+        finally:
+            self._pool.putconn(conn)
+
     def _create_exec_function_if_not_exist(self):
         """Creates the 'exec' function via a direct DB connection if it doesn't exist."""
-        if not all([self.db_host, self.db_port, self.db_name, self.db_user, self.db_password]):
+        if self._exec_function_ready:
+            return
+
+        if not self._has_db_credentials():
             print("Warning: DB connection details not found in .env. Cannot verify 'exec' function.")
             print("Please ensure DB_HOST, DB_PORT, DB_NAME, DB_USER, and DB_PASSWORD are set.")
             return
 
-        conn_string = f"dbname='{self.db_name}' user='{self.db_user}' host='{self.db_host}' port='{self.db_port}' password='{self.db_password}' options='-c search_path=public'"
-        
         function_sql = """
         CREATE OR REPLACE FUNCTION public.exec(sql text)
         RETURNS void AS $
@@ -65,9 +195,10 @@ class SupabaseConfig:
         """
 
         try:
-            with psycopg2.connect(conn_string) as conn:
+            with self._connection() as conn:
                 with conn.cursor() as cur:
                     cur.execute(function_sql)
+            self._exec_function_ready = True
             print("Successfully ensured 'exec' function exists in Supabase.")
         except psycopg2.OperationalError as e:
             print(f"Could not connect to the database to create 'exec' function: {e}")
@@ -79,6 +210,12 @@ class SupabaseConfig:
 
     def _map_dtype_to_sql(self, dtype) -> str:
         """Maps pandas dtype to PostgreSQL type."""
+        kind = getattr(dtype, 'kind', None)
+        if kind is not None:
+            # Default to TEXT for objects, strings, or any other type
+            return _KIND_TO_SQL.get(kind, 'TEXT')
+
+        # Extension dtypes without a NumPy kind
         if pd.api.types.is_integer_dtype(dtype):
             return 'BIGINT'
         if pd.api.types.is_float_dtype(dtype):
@@ -87,9 +224,21 @@ class SupabaseConfig:
             return 'BOOLEAN'
         if pd.api.types.is_datetime64_any_dtype(dtype):
             return 'TIMESTAMPTZ'
-        # Default to TEXT for objects, strings, or any other type
         return 'TEXT'
 
+    def _load_known_tables(self):
+        """Loads every public table name in one query, so each endpoint doesn't check information_schema itself."""
+        # Uses a direct DB connection to bypass schema cache issues
+        try:
+            with self._connection() as conn:
+                with conn.cursor() as cur:
+                    cur.execute("SELECT table_name FROM information_schema.tables WHERE table_schema = 'public';")
+                    self._known_tables.update(row[0] for row in cur.fetchall())
+        except Exception as e:
+            print(f"Database connection error: {e}")
+            raise
+        self._known_tables_loaded = True
+
     def create_table_if_not_exist(self, table_name: str, df: pd.DataFrame, primary_key: str):
         """Creates a table in Supabase if it doesn't already exist, based on DataFrame schema."""
         if self.client is None:
@@ -102,142 +251,209 @@ class SupabaseConfig:
                 raise ValueError(f"Primary key '{primary_key}' not found in DataFrame for table '{table_name}'.")
             primary_key = pk_in_cols[0]
 
-        # Check if table exists using a direct DB connection to bypass schema cache issues
-        conn_string = f"dbname='{self.db_name}' user='{self.db_user}' host='{self.db_host}' port='{self.db_port}' password='{self.db_password}' options='-c search_path=public'"
-        try:
-            with psycopg2.connect(conn_string) as conn:
-                with conn.cursor() as cur:
-                    cur.execute("SELECT EXISTS (SELECT 1 FROM information_schema.tables WHERE table_name = %s);", (table_name,))
-                    table_exists = cur.fetchone()[0]
-        except Exception as e:
-            print(f"Database connection error: {e}")
-            raise
+        if not self._known_tables_loaded:
+            self._load_known_tables()
 
-        if table_exists:
+        if table_name in self._known_tables:
             print(f"Table '{table_name}' already exists.")
             return
 
         print(f"Table '{table_name}' does not exist. Creating it...")
-        columns_sql = []
-        for col, dtype in df.dtypes.items():
-            sql_type = self._map_dtype_to_sql(dtype)
-            if col.lower() == primary_key.lower():
-                columns_sql.append(f'"{col}" {sql_type} PRIMARY KEY')
-            else:
-                columns_sql.append(f'"{col}" {sql_type}')
-        
-        create_sql = f'CREATE TABLE public."{table_name}" ({', '.join(columns_sql)})'
-        
+        columns_sql = sql.SQL(', ').join(
+            sql.SQL('{} {}{}').format(
+                sql.Identifier(col),
+                sql.SQL(self._map_dtype_to_sql(dtype)),
+                sql.SQL(' PRIMARY KEY' if col.lower() == primary_key.lower() else ''),
+            )
+            for col, dtype in df.dtypes.items()
+        )
+        table = sql.SQL('public.{}').format(sql.Identifier(table_name))
+        create_sql = sql.SQL('CREATE TABLE {} ({})').format(table, columns_sql)
+        # Disable Row Level Security (RLS) for the new table
+        disable_rls_sql = sql.SQL('ALTER TABLE {} DISABLE ROW LEVEL SECURITY').format(table)
+
         try:
-            # Use rpc to execute raw SQL.
-            self.client.rpc('exec', {'sql': create_sql}).execute()
+            # Both statements run in one transaction on the direct DB connection
+            with self._connection() as conn:
+                with conn.cursor() as cur:
+                    cur.execute(create_sql)
+                    cur.execute(disable_rls_sql)
             print(f"Table '{table_name}' created successfully.")
-
-            # Disable Row Level Security (RLS) for the new table
-            disable_rls_sql = f'ALTER TABLE public."{table_name}" DISABLE ROW LEVEL SECURITY'
-            self.client.rpc('exec', {'sql': disable_rls_sql}).execute()
             print(f"Row Level Security disabled for table '{table_name}'.")
 
+            self._known_tables.add(table_name)
+
             # After creating the table, the Supabase client's schema cache might be stale.
-            # Re-initializing the client is a workaround to refresh the schema.
-            print("Re-initializing Supabase client to refresh schema cache.")
-            self.initialize()
+            # Recreating the client refreshes it; the 'exec' function is already in place.
+            print("Recreating Supabase client to refresh schema cache.")
+            self.client = self._create_client()
 
         except Exception as e:
             print(f"Failed to create table '{table_name}': {e}")
             raise
 
     def expand_json_columns(self, df: pd.DataFrame) -> pd.DataFrame:
-        """Expands columns containing JSON strings, dicts, or lists of dicts into separate columns."""
-        df = df.copy()
-        
+        """Expands columns containing JSON strings or dicts into separate columns.
+
+        Nested dicts are flattened into dotted columns (e.g. 'contact.name'),
+        aligned with their parent row. Lists (e.g. 'line_items') are kept as a
+        single column, which becomes a TEXT column holding the list as JSON:
+        exploding them would repeat the parent row and break its primary key.
+        """
+        # Shallow copy: parsed columns are swapped in below without copying the
+        # data or touching the caller's frame (it may still be exporting to CSV)
+        df = df.copy(deep=False)
+
         # Identify columns that need expansion
         cols_to_expand = []
         for col in df.columns:
-            if df[col].dtype == 'object':
-                sample = df[col].dropna().iloc[0] if not df[col].dropna().empty else None
-                if isinstance(sample, str) and ('[' in sample or '{' in sample):
-                    # Attempt to deserialize string representations of JSON
-                    try:
-                        df[col] = df[col].apply(lambda x: json.loads(x) if isinstance(x, str) else x)
-                        sample = df[col].dropna().iloc[0] if not df[col].dropna().empty else None
-                    except (json.JSONDecodeError, TypeError):
-                        pass # Not a valid JSON string, leave as is
-
-                if isinstance(sample, (dict, list)):
-                    cols_to_expand.append(col)
-
-        for col in cols_to_expand:
-            # Handle lists of dictionaries
-            if not df[col].dropna().empty and isinstance(df[col].dropna().iloc[0], list):
-                # Create a temporary DataFrame with the original index and the list column
-                temp_df = df[[df.index.name if df.index.name else 'index_col', col]].copy()
-                if not df.index.name:
-                    temp_df['index_col'] = df.index # Add a temporary index column if not named
-
-                # Explode the list column
-                temp_df = temp_df.explode(col)
-                
-                # Normalize the exploded dictionaries
-                normalized_list_df = pd.json_normalize(temp_df[col])
-                
-                # Prefix columns
-                normalized_list_df.columns = [f"{col}.{sub_col}" for sub_col in normalized_list_df.columns]
-                
-                # Join back to the original DataFrame's index
-                # First, drop the original list column from df
-                df = df.drop(columns=[col])
-                
-                # Merge the normalized data back. Use left_index=True, right_index=True
-                # to join on the index, which was preserved by explode.
-                df = df.merge(normalized_list_df, left_index=True, right_index=True, how='left')
-
-            # Handle single dictionaries
-            elif not df[col].dropna().empty and isinstance(df[col].dropna().iloc[0], dict):
-                # Normalize the dictionary column
-                expanded_col = pd.json_normalize(df[col])
-                expanded_col.columns = [f"{col}.{sub_col}" for sub_col in expanded_col.columns]
-                
-                # Drop original column and join expanded columns
-                df = df.drop(columns=[col])
-                df = df.join(expanded_col)
-        return df
-
-    def prepare_data_for_supabase(self, records: list) -> list:
-        """Cleans data for Supabase insertion (e.g., converts NaN to None)."""
-        clean_records = []
+            # Numeric, boolean, datetime and category columns can't hold JSON
+            if df[col].dtype != 'object':
+                continue
+
+            sample = _first_non_null(df[col].values)
+            if isinstance(sample, str) and sample[:1] in ('[', '{'):
+                # Attempt to deserialize string representations of JSON
+                try:
+                    df[col] = df[col].map(lambda x: _json_loads(x) if isinstance(x, (str, bytes)) else x)
+                    sample = _json_loads(sample)
+                except (ValueError, TypeError):
+                    pass # Not a valid JSON string, leave as is
+
+            if isinstance(sample, dict):
+                cols_to_expand.append(col)
+
+        if not cols_to_expand:
+            return df
+
+        # Walk the dict columns once, filling one list per flattened key
+        flat_cols = {}
+
+        def add(prefix, value, row):
+            for key, sub_value in value.items():
+                name = f"{prefix}.{key}"
+                if isinstance(sub_value, dict):
+                    add(name, sub_value, row)
+                    continue
+                column = flat_cols.setdefault(name, [])
+                if len(column) < row:
+                    column.extend([None] * (row - len(column)))
+                column.append(sub_value)
+
+        for row, values in enumerate(zip(*(df[col] for col in cols_to_expand))):
+            for col, value in zip(cols_to_expand, values):
+                if isinstance(value, dict):
+                    add(col, value, row)
+
+        # Pad columns missing from the trailing rows
+        for column in flat_cols.values():
+            if len(column) < len(df):
+                column.extend([None] * (len(df) - len(column)))
+
+        expanded = pd.DataFrame(flat_cols, index=df.index)
+        return df.drop(columns=cols_to_expand).join(expanded)
+
+    def prepare_data_for_supabase(self, records: list, json_columns: list = None) -> list:
+        """Serializes dict/list values to JSON strings for Supabase insertion.
+
+        NaN values are expected to already be None (see pipeline.main). Pass
+        json_columns to only walk the columns known to hold dicts or lists.
+        """
+        if json_columns is None:
+            json_columns = {key for record in records for key, value in record.items() if isinstance(value, (dict, list))}
+        if not json_columns:
+            return records
+
+        for record in records:
+            for key in json_columns:
+                value = record.get(key)
+                if isinstance(value, (dict, list)):
+                    record[key] = _json_dumps(value) # Serialize complex types to JSON string
+        return records
+
+    def _upsert_batch(self, table_name: str, batch: list, primary_key: str) -> int:
+        """Upserts one batch, backing off and retrying when Supabase is rate limiting or busy."""
+        for attempt in range(UPSERT_MAX_RETRIES + 1):
+            try:
+                # The `upsert` method handles the insert-or-update logic automatically.
+                response = self.client.table(table_name).upsert(batch, on_conflict=primary_key).execute()
+
+                # Check for errors in the response from Supabase
+                if hasattr(response, 'error') and response.error:
+                    raise Exception(f"Supabase returned an error: {response.error}")
+                return len(batch)
+            except Exception as e:
+                if attempt < UPSERT_MAX_RETRIES and _is_retryable(e):
+                    time.sleep(UPSERT_BACKOFF_SECONDS * (2 ** attempt))
+                    continue
+                raise
+
+    def _copy_upsert(self, table_name: str, records: list, primary_key: str) -> int:
+        """Bulk upserts records by COPYing them into a temp table and merging with INSERT ... ON CONFLICT."""
+        columns = list(records[0].keys())
+
+        # Stream the records as CSV into memory for COPY
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
         for record in records:
-            clean_record = {}
-            for key, value in record.items():
-                if pd.isna(value) or value is np.nan:
-                    clean_record[key] = None
-                elif isinstance(value, (dict, list)):
-                    clean_record[key] = json.dumps(value, cls=CustomJSONEncoder) # Serialize complex types to JSON string
-                else:
-                    clean_record[key] = value
-            clean_records.append(clean_record)
-        return clean_records
+            writer.writerow([_COPY_NULL if record.get(col) is None else record.get(col) for col in columns])
+        buffer.seek(0)
+
+        target = sql.SQL('public.{}').format(sql.Identifier(table_name))
+        temp = sql.Identifier(f"t_{table_name}")
+        column_list = sql.SQL(', ').join(sql.Identifier(col) for col in columns)
+        updates = [col for col in columns if col != primary_key]
+        if updates:
+            on_conflict = sql.SQL('DO UPDATE SET {}').format(sql.SQL(', ').join(
+                sql.SQL('{0} = EXCLUDED.{0}').format(sql.Identifier(col)) for col in updates
+            ))
+        else:
+            on_conflict = sql.SQL('DO NOTHING')
+
+        with self._connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute(sql.SQL('CREATE TEMP TABLE {} (LIKE {} INCLUDING DEFAULTS) ON COMMIT DROP').format(temp, target))
+                cur.copy_expert(
+                    sql.SQL("COPY {} ({}) FROM STDIN WITH (FORMAT csv, NULL {})").format(
+                        temp, column_list, sql.Literal(_COPY_NULL)
+                    ).as_string(cur),
+                    buffer,
+                )
+                cur.execute(sql.SQL('INSERT INTO {0} ({1}) SELECT {1} FROM {2} ON CONFLICT ({3}) {4}').format(
+                    target, column_list, temp, sql.Identifier(primary_key), on_conflict
+                ))
+        return len(records)
 
     def upsert_data(self, table_name: str, records: list, primary_key: str):
-        """Upserts data into a Supabase table."""
+        """Upserts data into a Supabase table.
+
+        Large tables are loaded with COPY over the direct DB connection; small ones
+        go through the REST API in parallel batches.
+        """
         if not records:
             print(f"No records to upsert for table '{table_name}'.")
             return
 
+        if len(records) > COPY_UPSERT_THRESHOLD and self._has_db_credentials():
+            try:
+                upserted = self._copy_upsert(table_name, records, primary_key)
+                print(f"Successfully upserted {upserted} records to '{table_name}' via COPY.")
+                return
+            except Exception as e:
+                print(f"Error bulk upserting data to '{table_name}' via COPY: {e}")
+                raise
+
         if self.client is None:
             raise ConnectionError("Supabase client not initialized.")
 
+        batches = [records[i:i + UPSERT_BATCH_SIZE] for i in range(0, len(records), UPSERT_BATCH_SIZE)]
         try:
-            # The `upsert` method handles the insert-or-update logic automatically.
-            response = self.client.table(table_name).upsert(records, on_conflict=primary_key).execute()
-
-            # Check for errors in the response from Supabase
-            if hasattr(response, 'error') and response.error:
-                raise Exception(f"Supabase returned an error: {response.error}")
+            with ThreadPoolExecutor(max_workers=UPSERT_WORKERS) as executor:
+                upserted = sum(executor.map(
+                    lambda batch: self._upsert_batch(table_name, batch, primary_key), batches
+                ))
 
-            print(f"Successfully upserted {len(records)} records to '{table_name}'.")
-            if response.data:
-                print(f"Upsert response sample: {response.data[:1]}")
+            print(f"Successfully upserted {upserted} records to '{table_name}' in {len(batches)} batch(es).")
         except Exception as e:
             print(f"Error upserting data to '{table_name}': {e}")
             # Log the first record that might be causing the issue
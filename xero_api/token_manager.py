@@ -3,6 +3,7 @@ import os
 import json
 import time
 import requests
+from requests.adapters import HTTPAdapter
 from datetime import datetime, timedelta
 from xero_python.api_client.oauth2 import OAuth2Token
 from dotenv import load_dotenv
@@ -16,9 +17,14 @@ CLIENT_SECRET = os.getenv('CLIENT_SECRET')
 # Buffer time in seconds before token expiry to start refreshing (5 minutes)
 TOKEN_REFRESH_BUFFER = 300
 
+# Shared session so token refreshes reuse a kept-alive connection to identity.xero.com
+SESSION = requests.Session()
+SESSION.mount('https://', HTTPAdapter(pool_connections=16, pool_maxsize=32))
+
 def store_token(token):
-    # Add timestamp when token was stored
-    token['stored_at'] = int(time.time())
+    # Add timestamp when token was stored, keeping the one set on refresh so
+    # re-saving (e.g. to cache the tenant ID) doesn't push back its expiry
+    token.setdefault('stored_at', int(time.time()))
     with open(TOKEN_FILE, "w") as f:
         json.dump(token, f, indent=2)
 
@@ -65,12 +71,17 @@ def save_xero_oauth2_token(token):
     """Save token to file with timestamp."""
     store_token(token)
 
+def save_xero_tenant_id(token, tenant_id):
+    """Caches the tenant ID in the token file so later runs can skip get_connections."""
+    token['tenant_id'] = tenant_id
+    store_token(token)
+
 def refresh_xero_oauth2_token(client_id, client_secret, token):
     """Refreshes the Xero OAuth2 token."""
     if 'refresh_token' not in token:
         raise ValueError("Token dictionary must contain a 'refresh_token'")
 
-    response = requests.post(
+    response = SESSION.post(
         "https://identity.xero.com/connect/token",
         headers={
             "Content-Type": "application/x-www-form-urlencoded",
@@ -89,7 +100,11 @@ def refresh_xero_oauth2_token(client_id, client_secret, token):
     # Preserve the old refresh token if a new one isn't provided.
     if 'refresh_token' not in new_token:
         new_token['refresh_token'] = token['refresh_token']
-        
+
+    # A refreshed token still belongs to the same organisation
+    if 'tenant_id' in token:
+        new_token['tenant_id'] = token['tenant_id']
+
     # Add timestamp and calculate expiration
     current_time = int(time.time())
     new_token['stored_at'] = current_time
@@ -1,6 +1,5 @@
 import os
 import json
-import pickle
 from datetime import datetime, timedelta
 from xero_python.api_client import ApiClient, Configuration
 from xero_python.api_client.oauth2 import OAuth2Token
@@ -9,9 +8,37 @@ from xero_python.payrollau import PayrollAuApi
 from requests_oauthlib import OAuth2Session
 from oauthlib.oauth2 import TokenExpiredError
 
+# orjson reads and writes JSON bytes much faster than the stdlib; fall back if it isn't installed
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+def _json_loads(data):
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+def _json_dump_bytes(obj) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj).encode('utf-8')
+
 TOKEN_FILE = 'xero_token.json'  # Using JSON for better readability and consistency
 TOKEN_EXPIRY_BUFFER = 300  # 5 minutes buffer
 
+# Parsed token file shared by XeroClient instances, re-read only when the file changes
+_TOKEN_CACHE = {'data': None, 'mtime': 0}
+
+def _atomic_write(path, data: bytes):
+    """Write a file via a fsynced temp file and os.replace, so a crash never leaves it half-written"""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
 class XeroClient:
     def __init__(self):
         self.client_id = os.getenv('CLIENT_ID')
@@ -50,16 +77,25 @@ class XeroClient:
             
             # Initialize API client
             api_client = ApiClient(config)
+            # Ask for compressed responses; urllib3 decompresses them transparently
+            api_client.set_default_header('Accept-Encoding', 'gzip, deflate')
             
             # Initialize APIs
             self.accounting_api = AccountingApi(api_client)
             self.payroll_api = PayrollAuApi(api_client)
             
+            # The tenant ID is cached in the token file after the first lookup
+            if self.token.get('tenant_id'):
+                self.tenant_id = self.token['tenant_id']
+                return
+
             # Get the first organization to set tenant_id
             orgs = self.accounting_api.get_organisations()
             if orgs and orgs.organisations:
                 self.tenant_id = orgs.organisations[0].tenant_id
                 print(f"Using organization: {orgs.organisations[0].name}")
+                self.token = {**self.token, 'tenant_id': self.tenant_id}
+                self._save_token(self.token)
             else:
                 raise Exception("No organizations found for this account")
             
@@ -93,22 +129,34 @@ class XeroClient:
     def _load_token(self):
         if os.path.exists(TOKEN_FILE):
             try:
-                with open(TOKEN_FILE, 'r') as f:
-                    token_data = json.load(f)
+                mtime = os.stat(TOKEN_FILE).st_mtime
+                if _TOKEN_CACHE['data'] is not None and mtime == _TOKEN_CACHE['mtime']:
+                    return dict(_TOKEN_CACHE['data'])
+                with open(TOKEN_FILE, 'rb') as f:
+                    token_data = _json_loads(f.read())
                     print("Token loaded successfully")
                     # Ensure scope is a string
                     if isinstance(token_data.get('scope'), list):
                         token_data['scope'] = ' '.join(token_data['scope'])
-                    return token_data
-            except (json.JSONDecodeError, Exception) as e:
+                    _TOKEN_CACHE['data'] = token_data
+                    _TOKEN_CACHE['mtime'] = mtime
+                    return dict(token_data)
+            except (ValueError, Exception) as e:
                 print(f"Error loading token file: {e}")
                 return None
         print("No token file found")
         return None
 
     def _save_token(self, token):
-        with open(TOKEN_FILE, 'w') as f:
-            json.dump(token, f)
+        # Refreshed tokens come back from Xero without our cached tenant ID
+        tenant_id = getattr(self, 'tenant_id', None) or (self.token or {}).get('tenant_id')
+        if tenant_id and not token.get('tenant_id'):
+            token = {**token, 'tenant_id': tenant_id}
+        self.token = token
+        _atomic_write(TOKEN_FILE, _json_dump_bytes(token))
+        # Write-through so the next load doesn't re-read what we just wrote
+        _TOKEN_CACHE['data'] = dict(token)
+        _TOKEN_CACHE['mtime'] = os.stat(TOKEN_FILE).st_mtime
 
     def is_token_valid(self):
         if not self.token:
@@ -1,13 +1,34 @@
 import os
+import csv
+import base64
 import json
 import requests
-import pandas as pd
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from datetime import datetime
 from dotenv import load_dotenv
-import webbrowser
 from http.server import BaseHTTPRequestHandler, HTTPServer
-from urllib.parse import urlparse, parse_qs
+from urllib.parse import urlparse, parse_qs, urlencode
 import threading
+from functools import lru_cache
+from itertools import chain
+from concurrent.futures import ThreadPoolExecutor
+
+# orjson reads and writes JSON bytes much faster than the stdlib; fall back if it isn't installed
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+def _json_loads(data):
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+def _json_dump_bytes(obj) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj).encode('utf-8')
 
 # Load environment variables
 load_dotenv()
@@ -18,6 +39,12 @@ CLIENT_SECRET = os.getenv('CLIENT_SECRET')
 REDIRECT_URI = os.getenv('REDIRECT_URI', 'http://localhost:5000/callback')
 TOKEN_FILE = 'xero_token.json'
 EXPORT_FOLDER = 'xero_exports'
+CSV_BUFFER_SIZE = 1 << 16  # 64 KB write buffer for CSV exports
+
+# Parsed token file, reused until the file changes on disk or the token nears expiry
+_TOKEN_CACHE = {'data': None, 'mtime': 0}
+# Auth headers for the current access token and tenant; callers must not mutate them
+_HEADER_CACHE = {'key': None, 'headers': None}
 
 # Base URLs for Xero API
 BASE_URLS = {
@@ -25,6 +52,32 @@ BASE_URLS = {
     'finance': 'https://api.xero.com/finance.xro/1.0'
 }
 
+# One session for every call to api.xero.com / identity.xero.com, so connections
+# are kept alive instead of paying a TLS handshake per request
+_SESSION = requests.Session()
+_SESSION.mount('https://', HTTPAdapter(
+    pool_connections=4,
+    pool_maxsize=8,
+    max_retries=Retry(total=3, backoff_factor=0.3, status_forcelist=[429, 500, 502, 503, 504]),
+))
+_SESSION.headers.update({'Accept': 'application/json', 'Accept-Encoding': 'gzip, deflate'})
+
+# Last ETag per endpoint+params, so unchanged reports come back as an empty 304
+ETAG_FILE = os.path.join(EXPORT_FOLDER, '.etags.json')
+_ETAGS = None
+_ETAG_LOCK = threading.Lock()
+
+# Xero allows 5 concurrent calls per tenant; exports run in parallel under this cap
+MAX_CONCURRENT_CALLS = 5
+_API_SEMAPHORE = threading.Semaphore(MAX_CONCURRENT_CALLS)
+EXPORT_WORKERS = 6
+
+# Records per page requested from paginated endpoints (Xero's default is 100)
+XERO_PAGE_SIZE = 100
+
+# Only one thread may refresh the token; the refresh token rotates on use
+_TOKEN_LOCK = threading.Lock()
+
 class XeroAuthHandler(BaseHTTPRequestHandler):
     def do_GET(self):
         self.send_response(200)
@@ -70,41 +123,68 @@ def get_token_from_code(auth_code):
         'redirect_uri': REDIRECT_URI
     }
     
-    response = requests.post(token_url, headers=headers, data=data)
+    response = _SESSION.post(token_url, headers=headers, data=data)
     response.raise_for_status()
     
-    token_data = response.json()
+    token_data = _json_loads(response.content)
     token_data['expires_at'] = datetime.now().timestamp() + token_data['expires_in']
     
-    with open(TOKEN_FILE, 'w') as f:
-        json.dump(token_data, f)
+    _write_token(token_data)
     
     return token_data
 
+def _atomic_write(path, data: bytes):
+    """Write a file via a fsynced temp file and os.replace, so a crash never leaves it half-written"""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+def _write_token(token_data):
+    """Write the token file and keep the in-process cache in step with it."""
+    _atomic_write(TOKEN_FILE, _json_dump_bytes(token_data))
+    _TOKEN_CACHE['data'] = token_data
+    _TOKEN_CACHE['mtime'] = os.stat(TOKEN_FILE).st_mtime
+
+@lru_cache(maxsize=1)
 def get_basic_token():
-    """Generate Basic Auth token for Xero API"""
-    import base64
+    """Generate Basic Auth token for Xero API (the credentials don't change within a run)"""
     return base64.b64encode(f"{CLIENT_ID}:{CLIENT_SECRET}".encode()).decode()
 
 def get_headers():
-    """Get headers with current access token"""
+    """Get headers with current access token (rebuilt only when the token or tenant changes)"""
     token_data = get_token()
-    return {
-        'Authorization': f'Bearer {token_data["access_token"]}',
-        'Xero-tenant-id': token_data.get('tenant_id', ''),
-        'Accept': 'application/json'
-    }
+    key = (token_data['access_token'], token_data.get('tenant_id', ''))
+    if _HEADER_CACHE['key'] != key:
+        _HEADER_CACHE['headers'] = {
+            'Authorization': f'Bearer {key[0]}',
+            'Xero-tenant-id': key[1]
+        }
+        _HEADER_CACHE['key'] = key
+    return _HEADER_CACHE['headers']
 
 def get_token():
     """Get current token or refresh if expired"""
-    if not os.path.exists(TOKEN_FILE):
+    try:
+        mtime = os.stat(TOKEN_FILE).st_mtime
+    except FileNotFoundError:
         raise Exception("No token found. Please run the authentication process first.")
     
-    with open(TOKEN_FILE, 'r') as f:
-        token_data = json.load(f)
+    token_data = _TOKEN_CACHE['data']
+    if token_data is None or mtime != _TOKEN_CACHE['mtime']:
+        with open(TOKEN_FILE, 'rb') as f:
+            token_data = _json_loads(f.read())
+        _TOKEN_CACHE['data'] = token_data
+        _TOKEN_CACHE['mtime'] = mtime
     
     if datetime.now().timestamp() >= token_data['expires_at'] - 60:  # Refresh 1 minute before expiry
-        token_data = refresh_token(token_data)
+        with _TOKEN_LOCK:
+            # Another thread may have refreshed while we waited
+            token_data = _TOKEN_CACHE['data'] or token_data
+            if datetime.now().timestamp() >= token_data['expires_at'] - 60:
+                token_data = refresh_token(token_data)
     
     return token_data
 
@@ -122,18 +202,17 @@ def refresh_token(token_data):
         'refresh_token': token_data['refresh_token']
     }
     
-    response = requests.post(token_url, headers=headers, data=data)
+    response = _SESSION.post(token_url, headers=headers, data=data)
     response.raise_for_status()
     
-    new_token_data = response.json()
+    new_token_data = _json_loads(response.content)
     new_token_data['expires_at'] = datetime.now().timestamp() + new_token_data['expires_in']
     
     # Preserve the refresh token if not returned
     if 'refresh_token' not in new_token_data:
         new_token_data['refresh_token'] = token_data['refresh_token']
     
-    with open(TOKEN_FILE, 'w') as f:
-        json.dump(new_token_data, f)
+    _write_token(new_token_data)
     
     return new_token_data
 
@@ -148,10 +227,10 @@ def get_tenant_id():
     connections_url = 'https://api.xero.com/connections'
     headers = get_headers()
     
-    response = requests.get(connections_url, headers=headers)
+    response = _SESSION.get(connections_url, headers=headers)
     response.raise_for_status()
     
-    connections = response.json()
+    connections = _json_loads(response.content)
     if not connections:
         raise Exception("No tenants found for this account")
     
@@ -160,20 +239,112 @@ def get_tenant_id():
     
     # Save tenant_id to token file
     token_data['tenant_id'] = tenant_id
-    with open(TOKEN_FILE, 'w') as f:
-        json.dump(token_data, f)
+    _write_token(token_data)
     
     return tenant_id
 
-def make_api_call(endpoint, params=None):
-    """Make API call to Xero"""
+def _get_etags():
+    """Load the ETag sidecar file once per process"""
+    global _ETAGS
+    if _ETAGS is None:
+        try:
+            with open(ETAG_FILE, 'rb') as f:
+                _ETAGS = _json_loads(f.read())
+        except (OSError, ValueError):
+            _ETAGS = {}
+    return _ETAGS
+
+def _etag_key(endpoint, params=None):
+    return f"{endpoint}?{urlencode(sorted((params or {}).items()))}"
+
+def _save_etag(key, etag):
+    """Remember an ETag for key, or forget the key when etag is None"""
+    with _ETAG_LOCK:
+        etags = _get_etags()
+        if etag is None:
+            if etags.pop(key, None) is None:
+                return
+        else:
+            etags[key] = etag
+        os.makedirs(EXPORT_FOLDER, exist_ok=True)
+        _atomic_write(ETAG_FILE, _json_dump_bytes(_ETAGS))
+
+def make_api_call(endpoint, params=None, use_etag=False):
+    """Make API call to Xero
+
+    With use_etag, the last ETag seen for this endpoint and params is sent as
+    If-None-Match, and (data, etag) is returned instead of data: data is None
+    when Xero answers 304 Not Modified. The new ETag isn't saved here; the
+    caller saves it with _save_etag once the data is safely on disk.
+    """
     url = f"{BASE_URLS['accounting']}/{endpoint}"
     headers = get_headers()
     
-    response = requests.get(url, headers=headers, params=params)
+    if use_etag:
+        etag = _get_etags().get(_etag_key(endpoint, params))
+        if etag:
+            headers = {**headers, 'If-None-Match': etag}
+    
+    with _API_SEMAPHORE:
+        response = _SESSION.get(url, headers=headers, params=params)
+    if use_etag and response.status_code == 304:
+        return None, etag
     response.raise_for_status()
     
-    return response.json()
+    data = _json_loads(response.content)
+    if use_etag:
+        return data, response.headers.get('ETag')
+    return data
+
+def _paged_get(endpoint, key, page_size=XERO_PAGE_SIZE):
+    """Fetch every page of a paginated endpoint and return the combined records.
+
+    Page 1 reports the page count (pagination.pageCount), so the remaining pages
+    are fetched concurrently. Without it, pages are read in order until a short one.
+    """
+    params = {'pageSize': page_size}
+    first = make_api_call(endpoint, {**params, 'page': 1})
+    records = first.get(key, [])
+    page_count = (first.get('pagination') or {}).get('pageCount')
+
+    if page_count is None:
+        page = 1
+        items = records
+        while len(items) >= page_size:
+            page += 1
+            items = make_api_call(endpoint, {**params, 'page': page}).get(key, [])
+            records.extend(items)
+        return records
+
+    if page_count > 1:
+        with ThreadPoolExecutor(max_workers=EXPORT_WORKERS) as executor:
+            pages = executor.map(
+                lambda page: make_api_call(endpoint, {**params, 'page': page}).get(key, []),
+                range(2, page_count + 1),
+            )
+            for items in pages:
+                records.extend(items)
+    return records
+
+def _write_csv_streaming(records, filepath):
+    """Write a list of dicts to CSV with csv.DictWriter and return the row count"""
+    # Union of keys in first-seen order, matching the columns pandas would produce
+    fieldnames = list(dict.fromkeys(key for record in records for key in record))
+    tmp_path = f"{filepath}.tmp"
+    with open(tmp_path, 'w', newline='', encoding='utf-8', buffering=CSV_BUFFER_SIZE) as f:
+        writer = csv.DictWriter(f, fieldnames=fieldnames)
+        writer.writeheader()
+        writer.writerows(records)
+    os.replace(tmp_path, filepath)
+    return len(records)
+
+def _iter_rows(data):
+    """Yield a report's rows, with section rows expanded in place"""
+    for row in data.get('Rows', []):
+        if 'Rows' in row:  # Section
+            yield from row['Rows']
+        else:  # Row
+            yield row
 
 def export_to_csv(data, filename):
     """Export data to CSV file"""
@@ -181,68 +352,92 @@ def export_to_csv(data, filename):
     filepath = os.path.join(EXPORT_FOLDER, f"{filename}.csv")
     
     if isinstance(data, list):
-        df = pd.DataFrame(data)
-    elif isinstance(data, dict) and 'Rows' in data:
+        # Flat endpoint lists are streamed straight to disk, no DataFrame needed
+        count = _write_csv_streaming(data, filepath)
+        print(f"Exported {count} rows to {filepath}")
+        return filepath
+    
+    # pandas is only needed for reports and single objects, so it's imported on first use
+    import pandas as pd
+    
+    if isinstance(data, dict) and 'Rows' in data:
         # Handle Xero report format
-        rows = []
-        for row in data.get('Rows', []):
-            if 'Rows' in row:  # Section
-                rows.extend(row['Rows'])
-            else:  # Row
-                rows.append(row)
-        df = pd.DataFrame(rows)
+        rows = _iter_rows(data)
+        first = next(rows, None)
+        if first is None:
+            print(f"No rows to export for {filename}")
+            return None
+        df = pd.DataFrame.from_records(chain((first,), rows))
     else:
         df = pd.DataFrame([data])
     
-    df.to_csv(filepath, index=False)
+    # Write beside the old export and swap it in, so a failed write never leaves a partial CSV
+    tmp_path = f"{filepath}.tmp"
+    with open(tmp_path, 'w', newline='', encoding='utf-8', buffering=CSV_BUFFER_SIZE) as f:
+        df.to_csv(f, index=False)
+    os.replace(tmp_path, filepath)
     print(f"Exported {len(df)} rows to {filepath}")
     return filepath
 
-def get_report(report_name, params=None):
-    """Get Xero report"""
+def get_report(report_name, params=None, use_etag=False):
+    """Get Xero report (as (data, etag) with use_etag, see make_api_call)"""
     endpoint = f"Reports/{report_name}"
-    return make_api_call(endpoint, params)
+    return make_api_call(endpoint, params, use_etag=use_etag)
+
+# (Xero report ID, export filename) for every report exported by export_all_reports
+_REPORTS = (
+    ('ProfitAndLoss', 'profit_and_loss'),
+    ('BalanceSheet', 'balance_sheet'),
+    ('AgedReceivablesByContact', 'aged_receivables'),
+    ('AgedPayablesByContact', 'aged_payables'),
+    ('BankSummary', 'bank_summary'),
+    ('ExecutiveSummary', 'executive_summary'),
+)
 
 def export_all_reports():
     """Export all available reports"""
-    reports = [
-        ('ProfitAndLoss', 'profit_and_loss'),
-        ('BalanceSheet', 'balance_sheet'),
-        ('AgedReceivablesByContact', 'aged_receivables'),
-        ('AgedPayablesByContact', 'aged_payables'),
-        ('BankSummary', 'bank_summary'),
-        ('ExecutiveSummary', 'executive_summary')
-    ]
-    
-    exported_files = []
-    for report_id, report_name in reports:
+    def export_report(report):
+        report_id, report_name = report
+        filepath = os.path.join(EXPORT_FOLDER, f"{report_name}.csv")
+        etag_key = _etag_key(f"Reports/{report_id}")
         try:
             print(f"Exporting {report_name}...")
-            data = get_report(report_id)
-            filepath = export_to_csv(data, report_name)
-            exported_files.append(filepath)
+            # Only ask for a 304 when there is a previous export to fall back on
+            if not os.path.exists(filepath):
+                _save_etag(etag_key, None)
+            data, etag = get_report(report_id, use_etag=True)
+            if data is None:
+                print(f"{report_name} unchanged, keeping {filepath}")
+                return filepath
+            exported = export_to_csv(data, report_name)
+            # Only vouch for the CSV once it has been written; otherwise forget
+            # the ETag so the next run fetches the report in full
+            _save_etag(etag_key, etag if exported else None)
+            return exported
         except Exception as e:
             print(f"Error exporting {report_name}: {str(e)}")
+            _save_etag(etag_key, None)
+            return None
+    
+    with ThreadPoolExecutor(max_workers=EXPORT_WORKERS) as executor:
+        exported_files = [filepath for filepath in executor.map(export_report, _REPORTS) if filepath]
     
     return exported_files
 
 def export_contacts():
     """Export contacts to CSV"""
     print("Exporting contacts...")
-    data = make_api_call('Contacts')
-    return export_to_csv(data.get('Contacts', []), 'contacts')
+    return export_to_csv(_paged_get('Contacts', 'Contacts'), 'contacts')
 
 def export_invoices():
     """Export invoices to CSV"""
     print("Exporting invoices...")
-    data = make_api_call('Invoices')
-    return export_to_csv(data.get('Invoices', []), 'invoices')
+    return export_to_csv(_paged_get('Invoices', 'Invoices'), 'invoices')
 
 def export_bank_transactions():
     """Export bank transactions to CSV"""
     print("Exporting bank transactions...")
-    data = make_api_call('BankTransactions')
-    return export_to_csv(data.get('BankTransactions', []), 'bank_transactions')
+    return export_to_csv(_paged_get('BankTransactions', 'BankTransactions'), 'bank_transactions')
 
 def authenticate():
     """Handle OAuth2 authentication flow"""
@@ -261,6 +456,7 @@ def authenticate():
     httpd = HTTPServer(server_address, XeroAuthHandler)
     
     # Open browser for authentication
+    import webbrowser
     auth_url = get_auth_url()
     print(f"Please visit this URL to authorize the application: {auth_url}")
     webbrowser.open(auth_url)
@@ -289,10 +485,15 @@ def main():
         
         # Export all data
         print("\nStarting data export...")
-        export_contacts()
-        export_invoices()
-        export_bank_transactions()
-        export_all_reports()
+        with ThreadPoolExecutor(max_workers=EXPORT_WORKERS) as executor:
+            futures = [
+                executor.submit(export_contacts),
+                executor.submit(export_invoices),
+                executor.submit(export_bank_transactions),
+                executor.submit(export_all_reports),
+            ]
+            for future in futures:
+                future.result()
         
         print("\n✅ Export completed successfully!")
         print(f"📁 Check the '{EXPORT_FOLDER}' directory for exported files.")
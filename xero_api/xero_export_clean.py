@@ -1,6 +1,12 @@
 import os
 import json
+import logging
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import pandas as pd
 from datetime import datetime, timedelta
 from dotenv import load_dotenv
@@ -8,10 +14,51 @@ import webbrowser
 from http.server import BaseHTTPRequestHandler, HTTPServer
 from urllib.parse import urlparse, parse_qs
 import base64
+from functools import lru_cache
+from types import MappingProxyType
+
+# orjson parses and serialises JSON much faster than the stdlib; fall back if it isn't installed
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+def _json_loads(data):
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+def _json_dump_bytes(obj) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj).encode('utf-8')
+
+# ijson parses list responses incrementally off the socket; without it they are read whole
+try:
+    import ijson
+except ImportError:
+    ijson = None
+
+# One progress bar for the daily P&L instead of several lines per day
+try:
+    from tqdm import tqdm
+except ImportError:
+    tqdm = None
+
+# Parquet output and the fast CSV writer need pyarrow; pandas CSV is used if it isn't installed
+try:
+    import pyarrow as pa
+    import pyarrow.csv as pacsv
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
 
 # Load environment variables
 load_dotenv()
 
+# Per-day P&L detail is logged at DEBUG; set LOGLEVEL=DEBUG to see it
+logger = logging.getLogger(__name__)
+
 # Configuration
 CLIENT_ID = os.getenv('CLIENT_ID')
 CLIENT_SECRET = os.getenv('CLIENT_SECRET')
@@ -19,9 +66,59 @@ REDIRECT_URI = os.getenv('REDIRECT_URI', 'http://localhost:5000/callback')
 TOKEN_FILE = 'xero_token.json'
 EXPORT_FOLDER = 'xero_exports'
 
+# Client credentials never change while the process runs, so encode them once
+_BASIC_AUTH = None
+if CLIENT_ID and CLIENT_SECRET:
+    _BASIC_AUTH = 'Basic ' + base64.b64encode(f"{CLIENT_ID}:{CLIENT_SECRET}".encode()).decode()
+
+# Output format for the data sets and reports ('csv' or 'parquet'); the daily
+# P&L has a fixed all-text schema, so it is written as zstd Parquet by default
+EXPORT_FORMAT = os.getenv('EXPORT_FORMAT', 'csv').lower()
+PNL_EXPORT_FORMAT = os.getenv('PNL_EXPORT_FORMAT', 'parquet').lower()
+
+# Frames longer than this are written with pyarrow's multithreaded CSV writer
+ARROW_CSV_MIN_ROWS = 5000
+
 # Base URLs for Xero API
 BASE_URL = 'https://api.xero.com/api.xro/2.0'
 
+# One kept-alive, pooled session for every Xero and identity call; urllib3
+# retries throttled and failed requests with exponential backoff
+_SESSION = requests.Session()
+_SESSION.mount('https://', HTTPAdapter(
+    pool_connections=4,
+    pool_maxsize=16,
+    max_retries=Retry(
+        total=3,
+        backoff_factor=2,
+        status_forcelist=[429, 500, 502, 503, 504],
+        allowed_methods=['GET', 'POST'],
+        respect_retry_after_header=True,
+    ),
+))
+
+# Daily P&L reports fetched at once (Xero allows 5 calls in flight per tenant),
+# and Xero's cap of 60 calls a minute
+PNL_WORKERS = int(os.getenv('PNL_MAX_WORKERS', '5'))
+RATE_LIMIT_CALLS = 60
+RATE_LIMIT_PERIOD = 60
+_rate_semaphore = threading.BoundedSemaphore(RATE_LIMIT_CALLS)
+
+# Value columns in the daily P&L file. A single-day report has one amount per
+# row; raise this if the reports ever carry comparison periods
+PNL_VALUE_COLUMNS = int(os.getenv('PNL_VALUE_COLUMNS', '1'))
+
+# Records per page for paginated list endpoints, and pages fetched at once
+XERO_PAGE_SIZE = 100
+PAGE_WORKERS = 4
+
+# Parsed token and the headers built from it, reused until the token is within
+# TOKEN_EXPIRY_BUFFER seconds of expiring
+TOKEN_EXPIRY_BUFFER = 60
+_TOKEN_CACHE = None
+_HEADERS_CACHE = None
+_TOKEN_LOCK = threading.Lock()
+
 class XeroAuthHandler(BaseHTTPRequestHandler):
     def do_GET(self):
         self.send_response(200)
@@ -54,11 +151,9 @@ def get_auth_url():
 def get_token_from_code(auth_code):
     """Exchange authorization code for access token"""
     token_url = 'https://identity.xero.com/connect/token'
-    auth_string = base64.b64encode(f"{CLIENT_ID}:{CLIENT_SECRET}".encode()).decode()
-    
     headers = {
         'Content-Type': 'application/x-www-form-urlencoded',
-        'Authorization': f'Basic {auth_string}'
+        'Authorization': _BASIC_AUTH
     }
     
     data = {
@@ -67,33 +162,75 @@ def get_token_from_code(auth_code):
         'redirect_uri': REDIRECT_URI
     }
     
-    response = requests.post(token_url, headers=headers, data=data)
+    response = _SESSION.post(token_url, headers=headers, data=data)
     response.raise_for_status()
     
-    token_data = response.json()
+    token_data = _json_loads(response.content)
     token_data['expires_at'] = datetime.now().timestamp() + token_data['expires_in']
     
-    with open(TOKEN_FILE, 'w') as f:
-        json.dump(token_data, f)
+    _write_token(token_data)
+    
+    # Make the next get_headers() pick up the new token
+    global _TOKEN_CACHE
+    with _TOKEN_LOCK:
+        _TOKEN_CACHE = None
     
     return token_data
 
+def _write_token(token_data):
+    """Replace the token file atomically, so a crash mid-write never loses the token"""
+    tmp_path = f"{TOKEN_FILE}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(_json_dump_bytes(token_data))
+    os.replace(tmp_path, TOKEN_FILE)
+
 def get_headers():
-    """Get headers with current access token"""
+    """Get headers with current access token, from memory while the token is still valid"""
+    global _TOKEN_CACHE, _HEADERS_CACHE
+    with _TOKEN_LOCK:
+        if _TOKEN_CACHE is not None and time.time() < _TOKEN_CACHE['expires_at'] - TOKEN_EXPIRY_BUFFER:
+            return _HEADERS_CACHE
+        
+        token_data = _TOKEN_CACHE
+        if token_data is None:
+            token_data = _load_token()
+        token_data = _ensure_fresh_token(token_data)
+        
+        # Rebuilt only when the access token or tenant changes; read-only so
+        # callers can't mutate the shared headers
+        if (_HEADERS_CACHE is None or _TOKEN_CACHE is None
+                or _TOKEN_CACHE['access_token'] != token_data['access_token']
+                or _TOKEN_CACHE['tenant_id'] != token_data['tenant_id']):
+            _HEADERS_CACHE = MappingProxyType({
+                'Authorization': 'Bearer ' + token_data['access_token'],
+                'Xero-tenant-id': token_data['tenant_id'],
+                'Accept': 'application/json',
+                # Report JSON compresses several-fold; urllib3 decompresses it transparently
+                'Accept-Encoding': 'gzip, deflate'
+            })
+        _TOKEN_CACHE = token_data
+        return _HEADERS_CACHE
+
+def _load_token():
+    """Read the token file from disk"""
     if not os.path.exists(TOKEN_FILE):
         raise Exception("No token found. Please run the authentication process first.")
     
-    with open(TOKEN_FILE, 'r') as f:
-        token_data = json.load(f)
+    with open(TOKEN_FILE, 'rb') as f:
+        return _json_loads(f.read())
+
+def _ensure_fresh_token(token_data):
+    """Refresh the token if it's about to expire and fill in the tenant ID if missing"""
+    changed = False
     
     # Refresh token if expired
-    if datetime.now().timestamp() >= token_data['expires_at'] - 60:  # 60 seconds buffer
+    if datetime.now().timestamp() >= token_data['expires_at'] - TOKEN_EXPIRY_BUFFER:
         token_url = 'https://identity.xero.com/connect/token'
-        auth_string = base64.b64encode(f"{CLIENT_ID}:{CLIENT_SECRET}".encode()).decode()
-        
+        # Only Basic auth and the refresh token go to the token endpoint,
+        # never the expired bearer token
         headers = {
             'Content-Type': 'application/x-www-form-urlencoded',
-            'Authorization': f'Basic {auth_string}'
+            'Authorization': _BASIC_AUTH
         }
         
         data = {
@@ -101,20 +238,21 @@ def get_headers():
             'refresh_token': token_data['refresh_token']
         }
         
-        response = requests.post(token_url, headers=headers, data=data)
+        response = _SESSION.post(token_url, headers=headers, data=data)
         response.raise_for_status()
         
-        new_token_data = response.json()
+        new_token_data = _json_loads(response.content)
         new_token_data['expires_at'] = datetime.now().timestamp() + new_token_data['expires_in']
         
         # Preserve the refresh token if not returned
         if 'refresh_token' not in new_token_data:
             new_token_data['refresh_token'] = token_data['refresh_token']
-        
-        with open(TOKEN_FILE, 'w') as f:
-            json.dump(new_token_data, f)
+        # The tenant doesn't change on refresh, so don't look it up again
+        if 'tenant_id' in token_data:
+            new_token_data['tenant_id'] = token_data['tenant_id']
         
         token_data = new_token_data
+        changed = True
     
     # Get tenant ID if not present
     if 'tenant_id' not in token_data:
@@ -124,61 +262,216 @@ def get_headers():
             'Accept': 'application/json'
         }
         
-        response = requests.get(connections_url, headers=headers)
+        response = _SESSION.get(connections_url, headers=headers)
         response.raise_for_status()
         
-        connections = response.json()
+        connections = _json_loads(response.content)
         if not connections:
             raise Exception("No tenants found for this account")
         
         # Use the first tenant by default
         token_data['tenant_id'] = connections[0]['tenantId']
-        
-        # Save tenant_id to token file
-        with open(TOKEN_FILE, 'w') as f:
-            json.dump(token_data, f)
+        changed = True
     
-    return {
-        'Authorization': f'Bearer {token_data["access_token"]}',
-        'Xero-tenant-id': token_data['tenant_id'],
-        'Accept': 'application/json'
-    }
+    # One write covers both a refresh and a newly found tenant ID
+    if changed:
+        _write_token(token_data)
+    
+    return token_data
+
+def _release_rate_slot_later():
+    timer = threading.Timer(RATE_LIMIT_PERIOD, _rate_semaphore.release)
+    timer.daemon = True
+    timer.start()
+
+@lru_cache(maxsize=32)
+def _endpoint_url(endpoint):
+    """Full URL for an endpoint; the script only ever calls a handful of them"""
+    return f"{BASE_URL}/{endpoint}"
 
-def make_api_call(endpoint, params=None):
-    """Make API call to Xero"""
-    url = f"{BASE_URL}/{endpoint}"
+def make_api_call(endpoint, params=None, stream=False):
+    """Make API call to Xero; with stream=True the unread response is returned"""
+    url = _endpoint_url(endpoint)
     headers = get_headers()
     
-    response = requests.get(url, headers=headers, params=params)
+    # Every call holds a rate slot for a minute, so no more than
+    # RATE_LIMIT_CALLS go out in any 60-second window
+    _rate_semaphore.acquire()
+    _release_rate_slot_later()
+    response = _SESSION.get(url, headers=headers, params=params, stream=stream)
     response.raise_for_status()
     
-    return response.json()
+    if stream:
+        return response
+    return _json_loads(response.content)
+
+def stream_api_call(endpoint, params=None):
+    """Yield the records of a list endpoint as they are parsed off the response"""
+    if ijson is None:
+        yield from make_api_call(endpoint, params).get(endpoint, [])
+        return
+    
+    with make_api_call(endpoint, params, stream=True) as response:
+        # Let urllib3 undo the gzip encoding before ijson sees the bytes
+        response.raw.decode_content = True
+        yield from ijson.items(response.raw, f'{endpoint}.item', use_float=True)
+
+def fetch_all_pages(endpoint, page_size=XERO_PAGE_SIZE):
+    """Fetch every page of a paginated list endpoint and return the combined records.
 
-def export_to_csv(data, filename):
-    """Export data to CSV file with proper file handling"""
+    Page 1 reports the page count (pagination.pageCount), so the remaining pages
+    are fetched concurrently. Without it, pages are read in order until a short one.
+    """
+    params = {'pageSize': page_size}
+    first = make_api_call(endpoint, {**params, 'page': 1})
+    records = first.get(endpoint, [])
+    page_count = (first.get('pagination') or {}).get('pageCount')
+    
+    if page_count is None:
+        page = 1
+        items = records
+        while len(items) >= page_size:
+            page += 1
+            items = list(stream_api_call(endpoint, {**params, 'page': page}))
+            records.extend(items)
+        return records
+    
+    if page_count > 1:
+        with ThreadPoolExecutor(max_workers=PAGE_WORKERS) as executor:
+            pages = executor.map(
+                lambda page: list(stream_api_call(endpoint, {**params, 'page': page})),
+                range(2, page_count + 1),
+            )
+            for items in pages:
+                records.extend(items)
+    return records
+
+# Leading columns of a flattened report, before the Column_1..N value columns
+REPORT_COLUMNS = ['Section', 'RowType', 'Account', 'AccountID']
+
+def flatten_report(report, include_top_level_rows=True):
+    """Flatten a Xero report into one DataFrame row per report row.
+
+    Rows are pulled out of their sections with a single pd.json_normalize call;
+    each row's cells are then spread across Account and Column_1..N, with the
+    first cell's attribute value as AccountID.
+    """
+    rows = report.get('Rows', [])
+    if include_top_level_rows:
+        # Rows outside any section (e.g. the header) are wrapped so every entry has 'Rows'
+        rows = [row if 'Rows' in row else {'Rows': [row]} for row in rows]
+    else:
+        rows = [row for row in rows if 'Rows' in row]
+    if not rows:
+        return pd.DataFrame(columns=REPORT_COLUMNS)
+    
+    df = pd.json_normalize(rows, record_path='Rows', meta=['Title'], meta_prefix='Section.', errors='ignore')
+    if 'Cells' not in df.columns:
+        return pd.DataFrame(columns=REPORT_COLUMNS)
+    df = df[df['Cells'].map(lambda cells: isinstance(cells, list))]
+    
+    flat = pd.DataFrame({
+        'Section': df['Section.Title'].fillna('No Section Title') if 'Section.Title' in df.columns else 'No Section Title',
+        'RowType': df['RowType'].fillna('') if 'RowType' in df.columns else '',
+    }, index=df.index)
+    
+    # One column per cell position, then each cell dict reduced to its value
+    cells = pd.DataFrame(df['Cells'].tolist(), index=df.index)
+    if cells.empty:
+        return flat.reindex(columns=REPORT_COLUMNS)
+    values = cells.apply(lambda column: column.str.get('Value'))
+    values.columns = ['Account'] + [f'Column_{i}' for i in range(1, values.shape[1])]
+    
+    flat = pd.concat([flat, values], axis=1)
+    flat.insert(3, 'AccountID', cells[0].str.get('Attributes').str.get(0).str.get('Value'))
+    return flat.reset_index(drop=True)
+
+def flatten_daily_pnl(report, report_date, fieldnames):
+    """Flatten one day's P&L report into the daily breakdown's columns"""
+    df = flatten_report(report, include_top_level_rows=False)
+    df.insert(0, 'ReportDate', report_date)
+    extra = df.columns.difference(fieldnames)
+    if len(extra):
+        # Dropping them would lose amounts without a trace
+        raise ValueError(f"report has more value columns than PNL_VALUE_COLUMNS allows: {list(extra)}")
+    # Columns a narrower day lacks come back as all-NaN float64, which Arrow
+    # won't put in a string field; object columns hold None instead
+    return df.reindex(columns=fieldnames).astype(object)
+
+def write_frame(df, filename, fmt=None):
+    """Write df to EXPORT_FOLDER as Parquet or CSV and return the file path"""
+    fmt = fmt or EXPORT_FORMAT
+    os.makedirs(EXPORT_FOLDER, exist_ok=True)
+    
+    if fmt == 'parquet' and pa is not None:
+        filepath = os.path.join(EXPORT_FOLDER, f"{filename}.parquet")
+        try:
+            df.to_parquet(filepath, engine='pyarrow', compression='zstd', index=False)
+            return filepath
+        except (pa.ArrowInvalid, pa.ArrowTypeError, pa.ArrowNotImplementedError) as e:
+            # Mixed nested values (e.g. Contacts addresses) may not map to one Arrow type
+            print(f"⚠️ Could not write {filename} as Parquet ({e}), falling back to CSV")
+            if os.path.exists(filepath):
+                os.remove(filepath)
+    
+    filepath = os.path.join(EXPORT_FOLDER, f"{filename}.csv")
+    if pa is not None and len(df) > ARROW_CSV_MIN_ROWS:
+        try:
+            table = pa.Table.from_pandas(df, preserve_index=False)
+            pacsv.write_csv(table, filepath, write_options=pacsv.WriteOptions(include_header=True))
+            return filepath
+        except (pa.ArrowInvalid, pa.ArrowTypeError, pa.ArrowNotImplementedError):
+            # Nested records (lists/dicts) can't be written by the Arrow CSV writer
+            pass
+    with open(filepath, 'w', newline='', encoding='utf-8') as f:
+        df.to_csv(f, index=False)
+    return filepath
+
+def write_empty(filename, fmt=None):
+    """Write an empty export file without building a DataFrame and return its path"""
+    fmt = fmt or EXPORT_FORMAT
+    os.makedirs(EXPORT_FOLDER, exist_ok=True)
+    
+    if fmt == 'parquet' and pa is not None:
+        filepath = os.path.join(EXPORT_FOLDER, f"{filename}.parquet")
+        pq.write_table(pa.table({}), filepath)
+        return filepath
+    
+    filepath = os.path.join(EXPORT_FOLDER, f"{filename}.csv")
+    open(filepath, 'w', encoding='utf-8').close()
+    return filepath
+
+def _is_empty(data):
+    """True for an empty list, or a report with nothing beyond its header row"""
+    if isinstance(data, list):
+        return not data
+    if isinstance(data, dict) and 'Rows' in data:
+        return all(row.get('RowType') == 'Header' for row in data['Rows'])
+    return not data
+
+def export_df(data, filename, fmt=None):
+    """Export API data to a file in EXPORT_FORMAT (or fmt)"""
     try:
-        os.makedirs(EXPORT_FOLDER, exist_ok=True)
-        filepath = os.path.join(EXPORT_FOLDER, f"{filename}.csv")
+        # Report responses wrap the report itself in a 'Reports' list
+        if isinstance(data, dict) and data.get('Reports'):
+            data = data['Reports'][0]
+        
+        # Small tenants return many empty lists and reports; skip pandas for those
+        if _is_empty(data):
+            filepath = write_empty(filename, fmt)
+            print(f"✅ Exported 0 rows to {filepath}")
+            return filepath
         
         # Convert data to DataFrame
         if isinstance(data, list):
             df = pd.DataFrame(data)
         elif isinstance(data, dict) and 'Rows' in data:
             # Handle Xero report format
-            rows = []
-            for row in data.get('Rows', []):
-                if 'Rows' in row:  # Section
-                    rows.extend(row['Rows'])
-                else:  # Row
-                    rows.append(row)
-            df = pd.DataFrame(rows)
+            df = flatten_report(data)
         else:
             df = pd.DataFrame([data])
         
-        # Write to CSV with explicit file handling
-        with open(filepath, 'w', newline='', encoding='utf-8') as f:
-            df.to_csv(f, index=False)
-            
+        filepath = write_frame(df, filename, fmt)
         print(f"✅ Exported {len(df)} rows to {filepath}")
         return filepath
         
@@ -191,11 +484,36 @@ def export_report(report_name, params=None):
     try:
         print(f"Exporting {report_name}...")
         data = make_api_call(f"Reports/{report_name}", params)
-        return export_to_csv(data, report_name.lower())
+        return export_df(data, report_name.lower())
     except Exception as e:
         print(f"Error exporting {report_name}: {str(e)}")
         return None
 
+# Query parameters shared by every daily P&L request; only the dates vary
+_PNL_PARAMS_BASE = MappingProxyType({
+    'standardLayout': 'true',
+    'paymentsOnly': 'false',
+    'timeframe': 'DAY'
+})
+
+def fetch_daily_pnl(date_str):
+    """Fetch and validate the P&L report for a single day"""
+    # Transient failures and 429s are retried by the session's HTTPAdapter
+    params = {**_PNL_PARAMS_BASE, 'fromDate': date_str, 'toDate': date_str}
+    
+    logger.debug("Fetching P&L data for %s", date_str)
+    data = make_api_call('Reports/ProfitAndLoss', params)
+    
+    if not data or 'Reports' not in data or not data['Reports']:
+        raise ValueError("Empty or invalid response from API")
+        
+    # Validate report data structure
+    report = data['Reports'][0]
+    if 'Rows' not in report or not report['Rows']:
+        raise ValueError("No rows found in report")
+        
+    return data
+
 def authenticate():
     """Handle OAuth2 authentication flow"""
     if os.path.exists(TOKEN_FILE):
@@ -237,21 +555,24 @@ def export_all():
         
         print("\nStarting data export...")
         
-        # Export standard data
+        # Export standard data (endpoint, filename, paginated)
         data_sets = [
-            ('Contacts', 'contacts'),
-            ('Invoices', 'invoices'),
-            ('BankTransactions', 'bank_transactions'),
-            ('Accounts', 'chart_of_accounts')
+            ('Contacts', 'contacts', True),
+            ('Invoices', 'invoices', True),
+            ('BankTransactions', 'bank_transactions', True),
+            ('Accounts', 'chart_of_accounts', False)
             # ('Journals', 'journals'),  # Commented out as per user request
             # ('ManualJournals', 'manual_journals')  # Commented out as per user request
         ]
         
-        for endpoint, filename in data_sets:
+        for endpoint, filename, paginated in data_sets:
             try:
                 print(f"Exporting {filename}...")
-                data = make_api_call(endpoint)
-                export_to_csv(data.get(endpoint, []), filename)
+                if paginated:
+                    records = fetch_all_pages(endpoint)
+                else:
+                    records = list(stream_api_call(endpoint))
+                export_df(records, filename)
             except Exception as e:
                 print(f"Error exporting {filename}: {str(e)}")
         
@@ -277,7 +598,6 @@ def export_all():
         
         try:
             # Initialize data structures
-            all_rows = []
             processed_days = 0
             failed_days = 0
             
@@ -291,141 +611,122 @@ def export_all():
             print(f"\n📅 Exporting P&L from 2025-01-01 to {end_date.strftime('%Y-%m-%d')} ({total_days} days)")
             print("This may take several minutes. Please be patient...\n")
             
-            # Process each day
-            current_date = start_date
-            day_count = 0
+            # Fetch every day concurrently and write each one as soon as the days
+            # before it are on disk, so a crash mid-year keeps what was fetched
+            dates = [(start_date + timedelta(days=offset)).strftime('%Y-%m-%d') for offset in range(total_days)]
+            day_count = total_days
             
-            while current_date <= end_date:
-                day_count += 1
-                date_str = current_date.strftime('%Y-%m-%d')
-                
-                print(f"\n📅 Day {day_count}/{total_days}: {date_str}")
-                print("-" * 50)
-                
-                try:
-                    # Configure API request with retry logic
-                    max_retries = 3
-                    retry_delay = 2  # seconds
-                    data = None
-                    
-                    for attempt in range(max_retries):
-                        try:
-                            params = {
-                                'fromDate': date_str,
-                                'toDate': date_str,
-                                'standardLayout': 'true',
-                                'paymentsOnly': 'false',
-                                'timeframe': 'DAY'
-                            }
-                            
-                            print(f"  🔍 Fetching P&L data for {date_str} (Attempt {attempt + 1}/{max_retries})...")
-                            data = make_api_call('Reports/ProfitAndLoss', params)
-                            
-                            if not data or 'Reports' not in data or not data['Reports']:
-                                raise ValueError("Empty or invalid response from API")
-                                
-                            # Validate report data structure
-                            report = data['Reports'][0]
-                            if 'Rows' not in report or not report['Rows']:
-                                raise ValueError("No rows found in report")
-                                
-                            break  # Success, exit retry loop
-                            
-                        except Exception as e:
-                            if attempt == max_retries - 1:  # Last attempt
-                                print(f"  ❌ Failed to fetch data for {date_str} after {max_retries} attempts")
-                                print(f"  Error: {str(e)}")
-                                failed_days += 1
-                                raise  # Re-raise to be caught by outer exception handler
-                            else:
-                                print(f"  ⚠️ Attempt {attempt + 1} failed, retrying in {retry_delay} seconds...")
-                                time.sleep(retry_delay)
-                    
-                    # We've already validated the report structure in the retry loop
-                    report = data['Reports'][0]
-                    report_date = current_date.strftime('%Y-%m-%d')
-                    sections = report.get('Rows', [])
-                    section_count = len(sections)
-                    
-                    if section_count == 0:
-                        print(f"  ⚠️ No sections found in report for {date_str}")
+            # The width is fixed up front so rows can be written before every
+            # day is known; built once and reused for every day's reindex, header and schema
+            fieldnames = pd.Index(
+                ['ReportDate'] + REPORT_COLUMNS + [f'Column_{i}' for i in range(1, PNL_VALUE_COLUMNS + 1)]
+            )
+            
+            os.makedirs(EXPORT_FOLDER, exist_ok=True)
+            use_arrow = pa is not None
+            row_count = 0
+            sample = []
+            
+            # With pyarrow, each day goes out through an Arrow writer (Parquet or
+            # CSV) against one fixed all-string schema; otherwise through pandas
+            if use_arrow:
+                schema = pa.schema([(name, pa.string()) for name in fieldnames])
+            if use_arrow and PNL_EXPORT_FORMAT == 'parquet':
+                output_file = os.path.join(EXPORT_FOLDER, 'profit_loss_daily_breakdown.parquet')
+                sink = pq.ParquetWriter(output_file, schema, compression='zstd')
+            elif use_arrow:
+                output_file = os.path.join(EXPORT_FOLDER, 'profit_loss_daily_breakdown.csv')
+                sink = pacsv.CSVWriter(output_file, schema)
+            else:
+                output_file = os.path.join(EXPORT_FOLDER, 'profit_loss_daily_breakdown.csv')
+                sink = open(output_file, 'w', newline='', encoding='utf-8')
+                pd.DataFrame(columns=fieldnames).to_csv(sink, index=False)
+            
+            # Days finish out of order; a finished day (None if its fetch failed)
+            # waits here only until every earlier day has been written
+            finished = {}
+            next_day = 0
+            
+            with sink, ThreadPoolExecutor(max_workers=PNL_WORKERS) as executor:
+                futures = {executor.submit(fetch_daily_pnl, date_str): date_str for date_str in dates}
+                completed = as_completed(futures)
+                if tqdm is not None:
+                    completed = tqdm(completed, total=total_days, desc='P&L', unit='day')
+                for future in completed:
+                    # Dropping the future lets its report be freed once it is written
+                    date_str = futures.pop(future)
+                    try:
+                        finished[date_str] = future.result()
+                        logger.debug("Fetched P&L for %s", date_str)
+                    except Exception as e:
+                        logger.warning("Error fetching P&L for %s: %s", date_str, e)
                         failed_days += 1
-                        current_date += timedelta(days=1)
-                        continue
-                        
-                    print(f"  📊 Found {section_count} sections to process...")
+                        finished[date_str] = None
                     
-                    try:
+                    while next_day < total_days and dates[next_day] in finished:
+                        date_str = dates[next_day]
+                        data = finished.pop(date_str)
+                        next_day += 1
+                        if data is None:
+                            continue
                         
-                        # Process each section in the report
-                        for section in sections:
-                            section_title = section.get('Title', 'No Section Title')
-                            rows = section.get('Rows', [])
-                            
-                            for row in rows:
-                                if 'Cells' not in row:
-                                    continue
-                                    
-                                # Create a row with the report date and section info
-                                row_data = {
-                                    'ReportDate': report_date,
-                                    'Section': section_title,
-                                    'RowType': row.get('RowType', '')
-                                }
-                                
-                                # Add cell data
-                                for i, cell in enumerate(row['Cells']):
-                                    col_name = f'Column_{i}' if i > 0 else 'Account'
-                                    row_data[col_name] = cell.get('Value', '')
-                                    
-                                    # Add account ID if available
-                                    if i == 0 and 'Attributes' in cell:
-                                        attrs = cell.get('Attributes', [{}])
-                                        if attrs and 'Value' in attrs[0]:
-                                            row_data['AccountID'] = attrs[0]['Value']
-                                
-                                all_rows.append(row_data)
+                        logger.debug("Day %d/%d: %s", next_day, total_days, date_str)
                         
-                        print(f"  ✅ Added {len(rows)} rows from {date_str}")
+                        # The report structure was validated when it was fetched
+                        report = data['Reports'][0]
+                        report_date = date_str
+                        sections = report.get('Rows', [])
+                        section_count = len(sections)
                         
-                    except Exception as e:
-                        print(f"  ❌ Error processing report for {date_str}: {str(e)}")
-                        if 'Reports' in data and data['Reports'] and len(data['Reports']) > 0:
-                            print(f"  Report structure: {json.dumps(list(data['Reports'][0].keys()), indent=2)}")
-                    
-                    # Move to next day
-                    current_date += timedelta(days=1)
-                    
-                except Exception as e:
-                    print(f"⚠️ Error processing {date_str}: {str(e)}")
+                        if section_count == 0:
+                            logger.warning("No sections found in report for %s", date_str)
+                            failed_days += 1
+                            continue
+                        
+                        logger.debug("Found %d sections to process", section_count)
+                        
+                        try:
+                            # Flatten the whole day in one pass and append it to the output
+                            day_df = flatten_daily_pnl(report, report_date, fieldnames)
+                            if use_arrow:
+                                sink.write_table(pa.Table.from_pandas(day_df, schema=schema, preserve_index=False))
+                            else:
+                                day_df.to_csv(sink, header=False, index=False)
+                            
+                            row_count += len(day_df)
+                            if len(sample) < 3:
+                                sample.extend(day_df.head(3 - len(sample)).to_dict('records'))
+                            
+                            logger.debug("Added %d rows from %s", len(day_df), date_str)
+                        
+                        except Exception as e:
+                            logger.warning("Error processing report for %s: %s", date_str, e)
+                            logger.debug("Report structure: %s", list(report.keys()))
+                            failed_days += 1
             
             # Calculate success rate
             processed_days = day_count - failed_days
             success_rate = (processed_days / day_count) * 100 if day_count > 0 else 0
             
-            # Export all rows to CSV with detailed feedback
-            if all_rows:
-                output_file = export_to_csv(all_rows, 'profit_loss_daily_breakdown')
-                if output_file:
-                    print("\n" + "="*60)
-                    print(f"✅ SUCCESS: Exported {len(all_rows)} rows from {processed_days} days to {output_file}")
-                    print("="*60)
-                    
-                    # Show summary
-                    print(f"\n📊 Export Summary:")
-                    print(f"- Total days processed: {day_count}")
-                    print(f"- Successfully exported: {processed_days} days")
-                    print(f"- Failed days: {failed_days}")
-                    print(f"- Success rate: {success_rate:.1f}%")
-                    
-                    # Show sample data
-                    print("\nSample of exported data:")
-                    sample = all_rows[:min(3, len(all_rows))]
-                    for i, row in enumerate(sample, 1):
-                        print(f"{i}. {row.get('Section', '')} - {row.get('Account', '')}: {row.get('Amount_1', 'N/A')}")
-                else:
-                    print("❌ Failed to export P&L data")
+            # Report the export with detailed feedback
+            if row_count:
+                print("\n" + "="*60)
+                print(f"✅ SUCCESS: Exported {row_count} rows from {processed_days} days to {output_file}")
+                print("="*60)
+                
+                # Show summary
+                print(f"\n📊 Export Summary:")
+                print(f"- Total days processed: {day_count}")
+                print(f"- Successfully exported: {processed_days} days")
+                print(f"- Failed days: {failed_days}")
+                print(f"- Success rate: {success_rate:.1f}%")
+                
+                # Show sample data
+                print("\nSample of exported data:")
+                for i, row in enumerate(sample, 1):
+                    print(f"{i}. {row.get('Section', '')} - {row.get('Account', '')}: {row.get('Amount_1', 'N/A')}")
             else:
+                os.remove(output_file)
                 print("\n⚠️ No P&L data found for the specified date range")
                     
         except Exception as e:
@@ -447,4 +748,5 @@ def export_all():
         print("\nIf the problem persists, please contact support with the error details above.")
 
 if __name__ == "__main__":
+    logging.basicConfig(level=os.getenv('LOGLEVEL', 'INFO').upper(), format='%(levelname)s %(message)s')
     export_all()
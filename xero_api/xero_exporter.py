@@ -1,7 +1,10 @@
 import os
-import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
 import pandas as pd
 from datetime import datetime
+from decimal import Decimal
 from typing import Dict, List, Any, Optional
 from xero_python.accounting import AccountingApi
 from xero_python.payrollau import PayrollAuApi
@@ -11,6 +14,107 @@ from xero_python.api_client.oauth2 import OAuth2Token
 # Local imports
 from xero_client import XeroClient
 
+CSV_BUFFER_SIZE = 1 << 16  # 64 KB write buffer for CSV exports
+
+# Xero allows 5 concurrent calls per tenant
+MAX_CONCURRENT_CALLS = 5
+_API_SEMAPHORE = threading.Semaphore(MAX_CONCURRENT_CALLS)
+
+# Reports fetched by get_financial_reports: (Xero report name, export filename)
+_REPORTS = tuple((name, name.lower()) for name in (
+    'ProfitAndLoss',
+    'AgedReceivablesByContact',
+    'AgedPayablesByContact',
+    'BalanceSheet',
+    'BankSummary',
+    'ExecutiveSummary',
+))
+
+# Accounting entities exported side by side:
+# result key -> (API method, response attribute, paginated)
+_ACCOUNTING_ENDPOINTS = {
+    'accounts': ('get_accounts', 'accounts', False),
+    'invoices': ('get_invoices', 'invoices', True),
+    'contacts': ('get_contacts', 'contacts', True),
+    'bank_transactions': ('get_bank_transactions', 'bank_transactions', True),
+    'manual_journals': ('get_manual_journals', 'manual_journals', True),
+}
+
+# ApiClient isn't guaranteed thread-safe, so every worker thread builds its own
+_thread_local = threading.local()
+
+# Xero returns up to 100 records per page; a shorter page is the last
+XERO_PAGE_SIZE = 100
+PAGE_WORKERS = 4
+
+def _clean(obj):
+    """Recursively converts the Decimals in a to_dict() result to floats."""
+    if isinstance(obj, Decimal):
+        return float(obj)
+    if isinstance(obj, dict):
+        return {k: _clean(v) for k, v in obj.items()}
+    if isinstance(obj, list):
+        return [_clean(v) for v in obj]
+    return obj
+
+# Flattened layout per endpoint, discovered from its first record:
+# (columns as (name, key path), key set of every nested object by key path)
+_SCHEMA_CACHE: Dict[str, Any] = {}
+
+# Marks a key a record doesn't have, as opposed to one whose value is None
+_MISSING = object()
+
+def _flat_schema(record: dict, prefix: str = '', path: tuple = ()) -> Any:
+    """Returns the columns and object key sets of a record, flattened like json_normalize(sep='_').
+
+    An empty object produces no columns, as json_normalize drops it. Like
+    json_normalize, the top level's own values come first and its objects'
+    columns after them; deeper levels keep their key order.
+    """
+    columns, nested = [], []
+    object_keys = {path: frozenset(record)}
+    for key, value in record.items():
+        if isinstance(value, dict):
+            sub_columns, sub_keys = _flat_schema(value, f"{prefix}{key}_", path + (key,))
+            (nested if not path else columns).extend(sub_columns)
+            object_keys.update(sub_keys)
+        else:
+            columns.append((f"{prefix}{key}", path + (key,)))
+    return columns + nested, object_keys
+
+def _lookup(record: dict, path: tuple) -> Any:
+    """Follows a key path, returning _MISSING if any key along it is absent."""
+    value = record
+    for key in path:
+        if not isinstance(value, dict):
+            return _MISSING
+        value = value.get(key, _MISSING)
+    return value
+
+def _schema_row(record: dict, schema: Any) -> Optional[List[Any]]:
+    """Reads a record's values along the schema's key paths, or None if json_normalize would lay it out differently."""
+    columns, object_keys = schema
+    for path, keys in object_keys.items():
+        obj = _lookup(record, path)
+        if obj is _MISSING:
+            continue
+        # A scalar where the first record had an object gets a column of its own,
+        # and unseen keys get new columns
+        if not isinstance(obj, dict) or not obj.keys() <= keys:
+            return None
+    row = []
+    for _, path in columns:
+        value = _lookup(record, path)
+        if isinstance(value, dict):
+            # An object where the first record had a scalar is expanded (or, if empty, dropped)
+            return None
+        # json_normalize fills absent keys with NaN but keeps explicit Nones
+        row.append(np.nan if value is _MISSING else value)
+    return row
+
+# Report cell column names, built once instead of formatted per cell
+_COL_NAMES = tuple(f'col_{i}' for i in range(64))
+
 class XeroExporter:
     def __init__(self):
         self.client = XeroClient()
@@ -22,27 +126,47 @@ class XeroExporter:
         if not data:
             return pd.DataFrame()
         
-        # Handle Decimal serialization
-        def json_serial(obj):
-            from decimal import Decimal
-            if isinstance(obj, Decimal):
-                return float(obj)
-            raise TypeError(f"Type {type(obj)} not serializable")
-        
-        # Convert to dict and serialize
-        dict_data = [json.loads(json.dumps(item.to_dict(), default=json_serial)) 
-                    for item in data]
+        # Convert to dict, with Decimals as floats
+        dict_data = [_clean(item.to_dict()) for item in data]
         
         # Flatten nested structures
         return pd.json_normalize(dict_data, sep='_')
 
+    def _export_records(self, data: List[Any], filename: str) -> str:
+        """Write Xero API models to CSV exactly as _to_dataframe would lay them out, and return the file path.
+
+        Records are flattened along the endpoint's cached schema instead of
+        through json_normalize; if any record doesn't fit it, the export falls
+        back to json_normalize. pandas still builds and writes the frame, so
+        values are typed and formatted the same either way.
+        """
+        if not data:
+            return ""
+
+        dict_data = [_clean(item.to_dict()) for item in data]
+        schema = _SCHEMA_CACHE.get(filename)
+        if schema is None:
+            schema = _SCHEMA_CACHE[filename] = _flat_schema(dict_data[0])
+
+        rows = []
+        for record in dict_data:
+            row = _schema_row(record, schema)
+            if row is None:
+                # Shapes vary across records; let pandas work out the full column set
+                del _SCHEMA_CACHE[filename]
+                return self._save_to_csv(pd.json_normalize(dict_data, sep='_'), filename)
+            rows.append(row)
+
+        return self._save_to_csv(pd.DataFrame(rows, columns=[name for name, _ in schema[0]]), filename)
+
     def _save_to_csv(self, df: pd.DataFrame, filename: str) -> str:
         """Save DataFrame to CSV and return the file path"""
         if df.empty:
             return ""
             
         filepath = os.path.join(self.export_dir, f"{filename}.csv")
-        df.to_csv(filepath, index=False)
+        with open(filepath, 'w', newline='', encoding='utf-8', buffering=CSV_BUFFER_SIZE) as f:
+            df.to_csv(f, index=False)
         return filepath
 
     def get_financial_reports(self) -> Dict[str, str]:
@@ -55,17 +179,7 @@ class XeroExporter:
         
         results = {}
         
-        # Define the reports to fetch
-        report_names = [
-            'ProfitAndLoss',
-            'AgedReceivablesByContact',
-            'AgedPayablesByContact',
-            'BalanceSheet',
-            'BankSummary',
-            'ExecutiveSummary'
-        ]
-        
-        for report_name in report_names:
+        for report_name, filename in _REPORTS:
             try:
                 # Get the report
                 report = self.client.accounting_api.get_report(
@@ -79,22 +193,21 @@ class XeroExporter:
                     rows = []
                     
                     # Process report rows
-                    if hasattr(report_data, 'rows') and report_data.rows:
-                        for row in report_data.rows:
-                            if hasattr(row, 'cells') and row.cells:
-                                row_data = {}
-                                for i, cell in enumerate(row.cells):
-                                    if hasattr(cell, 'value'):
-                                        row_data[f'col_{i}'] = cell.value
-                                    if hasattr(cell, 'attributes'):
-                                        for attr in cell.attributes:
-                                            row_data[attr.name] = attr.value
-                                rows.append(row_data)
+                    for row in getattr(report_data, 'rows', None) or ():
+                        cells = getattr(row, 'cells', None)
+                        if not cells:
+                            continue
+                        # Each cell's attributes follow its value, so columns keep that order
+                        row_data = {}
+                        for i, cell in enumerate(cells):
+                            row_data[_COL_NAMES[i] if i < len(_COL_NAMES) else f'col_{i}'] = getattr(cell, 'value', None)
+                            for attr in getattr(cell, 'attributes', None) or ():
+                                row_data[attr.name] = attr.value
+                        rows.append(row_data)
                     
                     # Create and save DataFrame
                     if rows:
                         df = pd.DataFrame(rows)
-                        filename = report_name.lower()
                         filepath = self._save_to_csv(df, filename)
                         if filepath:
                             results[report_name] = filepath
@@ -105,6 +218,65 @@ class XeroExporter:
         
         return results
 
+    def _thread_accounting_api(self) -> AccountingApi:
+        """Returns this thread's AccountingApi, rebuilt whenever the client re-initializes its own"""
+        shared = self.client.accounting_api
+        cached = getattr(_thread_local, 'accounting', None)
+        if cached is None or cached[0] is not shared:
+            api_client = ApiClient(self.client._configure_client())
+            api_client.set_default_header('Accept-Encoding', 'gzip, deflate')
+            # Reuse the client's urllib3 pool (which is thread-safe) and its kept-alive connections
+            api_client.rest_client.pool_manager = shared.api_client.rest_client.pool_manager
+            cached = _thread_local.accounting = (shared, AccountingApi(api_client))
+        return cached[1]
+
+    def _fetch_page(self, method: str, attr: str, page: Optional[int] = None):
+        """Fetch one page (or the whole unpaginated result) and return the response and its records"""
+        kwargs = {'xero_tenant_id': self.client.tenant_id}
+        if page is not None:
+            kwargs['page'] = page
+        api = self._thread_accounting_api()
+        with _API_SEMAPHORE:
+            response = getattr(api, method)(**kwargs)
+        return response, getattr(response, attr) or []
+
+    def _fetch_all_pages(self, method: str, attr: str) -> List[Any]:
+        """Fetch every page of a paginated endpoint, fanning out once the page count is known"""
+        response, records = self._fetch_page(method, attr, page=1)
+        records = list(records)
+        page_count = getattr(getattr(response, 'pagination', None), 'page_count', None)
+
+        if page_count is None:
+            # Older API versions don't report a page count; read pages until a short one
+            page, items = 1, records
+            while len(items) >= XERO_PAGE_SIZE:
+                page += 1
+                _, items = self._fetch_page(method, attr, page=page)
+                records.extend(items)
+            return records
+
+        if page_count > 1:
+            with ThreadPoolExecutor(max_workers=PAGE_WORKERS) as executor:
+                pages = executor.map(
+                    lambda page: self._fetch_page(method, attr, page=page)[1],
+                    range(2, page_count + 1),
+                )
+                for items in pages:
+                    records.extend(items)
+        return records
+
+    def _export_accounting_endpoint(self, name: str, method: str, attr: str, paginated: bool) -> Optional[str]:
+        """Fetch one accounting endpoint and save it to CSV"""
+        try:
+            if paginated:
+                records = self._fetch_all_pages(method, attr)
+            else:
+                _, records = self._fetch_page(method, attr)
+            return self._export_records(records, name)
+        except Exception as e:
+            print(f"Error fetching {name.replace('_', ' ')}: {e}")
+            return None
+
     def get_accounting_data(self) -> Dict[str, str]:
         """Fetch all accounting related data"""
         if not hasattr(self.client, 'tenant_id') or not self.client.tenant_id:
@@ -127,55 +299,15 @@ class XeroExporter:
         # Get financial reports first
         results.update(self.get_financial_reports())
         
-        # Accounts
-        try:
-            accounts = self.client.accounting_api.get_accounts(
-                xero_tenant_id=self.client.tenant_id
-            ).accounts
-            df = self._to_dataframe(accounts)
-            results['accounts'] = self._save_to_csv(df, 'accounts')
-        except Exception as e:
-            print(f"Error fetching accounts: {e}")
-        
-        # Invoices
-        try:
-            invoices = self.client.accounting_api.get_invoices(
-                xero_tenant_id=self.client.tenant_id
-            ).invoices
-            df = self._to_dataframe(invoices)
-            results['invoices'] = self._save_to_csv(df, 'invoices')
-        except Exception as e:
-            print(f"Error fetching invoices: {e}")
-        
-        # Contacts
-        try:
-            contacts = self.client.accounting_api.get_contacts(
-                xero_tenant_id=self.client.tenant_id
-            ).contacts
-            df = self._to_dataframe(contacts)
-            results['contacts'] = self._save_to_csv(df, 'contacts')
-        except Exception as e:
-            print(f"Error fetching contacts: {e}")
-        
-        # Bank Transactions
-        try:
-            bank_transactions = self.client.accounting_api.get_bank_transactions(
-                xero_tenant_id=self.client.tenant_id
-            ).bank_transactions
-            df = self._to_dataframe(bank_transactions)
-            results['bank_transactions'] = self._save_to_csv(df, 'bank_transactions')
-        except Exception as e:
-            print(f"Error fetching bank transactions: {e}")
-        
-        # Manual Journals
-        try:
-            manual_journals = self.client.accounting_api.get_manual_journals(
-                xero_tenant_id=self.client.tenant_id
-            ).manual_journals
-            df = self._to_dataframe(manual_journals)
-            results['manual_journals'] = self._save_to_csv(df, 'manual_journals')
-        except Exception as e:
-            print(f"Error fetching manual journals: {e}")
+        with ThreadPoolExecutor(max_workers=len(_ACCOUNTING_ENDPOINTS)) as executor:
+            futures = {
+                name: executor.submit(self._export_accounting_endpoint, name, *endpoint)
+                for name, endpoint in _ACCOUNTING_ENDPOINTS.items()
+            }
+            for name, future in futures.items():
+                filepath = future.result()
+                if filepath is not None:
+                    results[name] = filepath
         
         return results
 
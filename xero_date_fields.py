@@ -0,0 +1,28 @@
+"""Names of the Xero fields that hold dates, shared by the exporters."""
+
+# Every date field the exported endpoints return (Accounting, Payroll and the
+# Files API, which spells the UTC suffix 'Utc'); nothing else is worth parsing
+XERO_DATE_FIELDS = frozenset({
+    # Invoices, credit notes, bank transactions, payments, receipts
+    'Date', 'DateString', 'DueDate', 'DueDateString',
+    'ExpectedPaymentDate', 'PlannedPaymentDate', 'FullyPaidOnDate',
+    # Quotes
+    'ExpiryDate', 'ExpiryDateString',
+    # Journals
+    'JournalDate',
+    # Organisation lock dates
+    'PeriodLockDate', 'EndOfYearLockDate',
+    # Payroll employees and pay runs
+    'StartDate', 'EndDate', 'DateOfBirth', 'PaymentDate',
+    'PayRunPeriodStartDate', 'PayRunPeriodEndDate',
+    # Audit timestamps
+    'CreatedDateUTC', 'UpdatedDateUTC', 'CreatedDateUtc', 'UpdatedDateUtc',
+})
+
+
+def date_columns(columns):
+    """Return the columns naming a Xero date field, in their original order.
+
+    Flattened nested fields (e.g. 'Contact.UpdatedDateUTC') match on their last part.
+    """
+    return [col for col in columns if col.rsplit('.', 1)[-1] in XERO_DATE_FIELDS]